@@ -1,15 +1,20 @@
 import os
 import json
+import time
 import pandas as pd
 import anthropic
 from dotenv import load_dotenv
 from pathlib import Path
 
+import cassette
+import priority
+import rollup
+import tracing
+
 # ── Configuration ────────────────────────────────────────────────────────────
 
 load_dotenv()
 
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 MODEL = "claude-sonnet-4-20250514"
 
 # Load system prompt from Audit.md
@@ -18,42 +23,118 @@ SYSTEM_PROMPT = audit_md_path.read_text(encoding="utf-8").strip()
 if not SYSTEM_PROMPT:
     print("⚠️  Warning: Audit.md is empty. The LLM will have no grading instructions.")
 
+# Cassette layer for offline regression runs (see cassette.py / golden.py):
+#   "off"    — always call the live API
+#   "record" — replay recorded responses, call the API (and record) on a miss
+#   "replay" — replay only; a miss returns an ERROR row, never touches the network
+CASSETTE_MODE = os.getenv("AUDIT_CASSETTE_MODE", "off").strip().lower()
+CASSETTE_FILE = Path(os.getenv("AUDIT_CASSETTE_FILE",
+                               Path(__file__).parent / "audit_cassette.jsonl"))
+if CASSETTE_MODE not in ("off", "record", "replay"):
+    raise ValueError(f"AUDIT_CASSETTE_MODE must be off, record or replay (got {CASSETTE_MODE!r})")
+
+# When True, rows are audited highest-risk first (see priority.py) so likely
+# CRITICAL notes are graded early. The report keeps the export's row order.
+PRIORITY_SCHEDULING = True
+
+# Lazy Anthropic client — only created when a live call is actually made,
+# so cassette replays run without an API key or network.
+_client = None
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    return _client
+
 # ── Audit Function ───────────────────────────────────────────────────────────
 
+def _error_result(reason: str) -> dict:
+    return {"audit_score": "ERROR", "risk_level": "ERROR",
+            "language_score": 0, "detected_incidents": [],
+            "restrictive_practice_warning": False,
+            "coaching_sms": "", "reasoning": reason}
+
+
+def parse_audit_response(text: str) -> dict:
+    """Parse the model's reply (everything after the prefilled '{') into a result dict."""
+    return json.loads("{" + text)
+
+
+def _call_model(user_message: str) -> str:
+    """Run a live LLM call and return the raw response text."""
+    response = _get_client().messages.create(
+        model=MODEL,
+        max_tokens=1024,
+        system=SYSTEM_PROMPT,
+        messages=[
+            {"role": "user", "content": user_message},
+            # Prefill with '{' to force the model into JSON-object output
+            {"role": "assistant", "content": "{"},
+        ],
+    )
+    return response.content[0].text
+
+
+def build_user_message(note_text: str, client_goals: str) -> str:
+    """Format a note and its goals in the input layout Audit.md expects."""
+    return f"Note: {note_text}\nGoals: {client_goals}"
+
+
+def row_inputs(row) -> tuple:
+    """Extract (note, goals) from an export row exactly as the batch loop sends them."""
+    return str(row.get("Progress Note", "")), str(row.get("Goals Referenced", ""))
+
+
+def is_auditable(note: str) -> bool:
+    """False for empty / trivial notes, which are skipped without an LLM call."""
+    stripped = note.strip()
+    return len(stripped) >= 5 and stripped.lower() != "nan"
+
+
 def audit_note(note_text: str, client_goals: str) -> dict:
     """Send a single progress note to the LLM for NDIS compliance grading."""
 
-    user_message = f"Note: {note_text}\nGoals: {client_goals}"
+    user_message = build_user_message(note_text, client_goals)
 
     try:
-        response = client.messages.create(
-            model=MODEL,
-            max_tokens=1024,
-            system=SYSTEM_PROMPT,
-            messages=[
-                {"role": "user", "content": user_message},
-                # Prefill with '{' to force the model into JSON-object output
-                {"role": "assistant", "content": "{"},
-            ],
-        )
+        if CASSETTE_MODE == "off":
+            text = _call_model(user_message)
+        else:
+            text = cassette.lookup(CASSETTE_FILE, MODEL, SYSTEM_PROMPT, user_message)
+            if text is None:
+                if CASSETTE_MODE == "replay":
+                    print("    ⚠️  Cassette miss (replay mode, no network call made)")
+                    return _error_result("Cassette miss: request not recorded")
+                text = _call_model(user_message)
+                cassette.record(CASSETTE_FILE, MODEL, SYSTEM_PROMPT, user_message, text)
 
         # The response text is everything after our prefilled '{'
-        raw = "{" + response.content[0].text
-        result = json.loads(raw)
-        return result
+        return parse_audit_response(text)
 
     except json.JSONDecodeError as e:
         print(f"    ⚠️  JSON parse error: {e}")
-        return {"audit_score": "ERROR", "risk_level": "ERROR",
-                "language_score": 0, "detected_incidents": [],
-                "restrictive_practice_warning": False,
-                "coaching_sms": "", "reasoning": f"JSON parse error: {e}"}
+        return _error_result(f"JSON parse error: {e}")
     except Exception as e:
         print(f"    ⚠️  API error: {e}")
-        return {"audit_score": "ERROR", "risk_level": "ERROR",
-                "language_score": 0, "detected_incidents": [],
-                "restrictive_practice_warning": False,
-                "coaching_sms": "", "reasoning": f"API error: {e}"}
+        return _error_result(f"API error: {e}")
+
+# ── Rollup ───────────────────────────────────────────────────────────────────
+
+def record_rollup(conn, row, position: int, result: dict):
+    """Add a row's result to the per-day compliance buckets (see rollup.py).
+
+    Cassette runs and API-error rows are left out: they would replace the real
+    contribution recorded for the same Shift ID.
+    """
+    if CASSETTE_MODE != "off" or result.get("audit_score") == "ERROR":
+        return
+    rollup.record_result(conn, rollup.row_key(row, position), rollup.row_day(row),
+                         staff=str(row.get("Staff Member", "")).strip(),
+                         participant=str(row.get("Client", "")).strip(),
+                         shift_type=str(row.get("Shift Type", "")).strip(),
+                         goals=str(row.get("Goals Referenced", "")),
+                         result=result)
 
 # ── Batch Processing ─────────────────────────────────────────────────────────
 
@@ -62,32 +143,60 @@ def main():
     df = pd.read_csv(csv_path)
 
     total = len(df)
-    results = []
-
-    for idx, row in df.iterrows():
-        row_num = idx + 1
+    results = [None] * total
+    rollup_conn = rollup.connect()
+
+    if CASSETTE_MODE != "off":
+        print(f"📼 CASSETTE MODE: {CASSETTE_MODE} ({CASSETTE_FILE.name})\n")
+        cassette.load(CASSETTE_FILE)  # Fail the run now on a corrupt cassette, not row by row
+
+    if PRIORITY_SCHEDULING:
+        order, risk_scores = priority.dispatch_order(df, priority.load_keywords(audit_md_path))
+        print(f"🚦 PRIORITY SCHEDULING ON — {sum(1 for s in risk_scores if s)} row(s) "
+              f"with local red flags dispatched first\n")
+    else:
+        order = list(range(total))
+
+    started = time.perf_counter()
+    first_critical = None
+    exported_at = csv_path.stat().st_mtime
+
+    for dispatched, pos in enumerate(order, 1):
+        row = df.iloc[pos]
+        row_num = pos + 1
         staff = row.get("Staff Member", "Unknown")
-        note = str(row.get("Progress Note", ""))
-        goals = str(row.get("Goals Referenced", ""))
+        note, goals = row_inputs(row)
+        trace_id = tracing.new_trace_id()
+        picked_up = time.time()
+        tracing.record_span(trace_id, "export", exported_at, picked_up,
+                            source=csv_path.name, shift_id=str(row.get("Shift ID", "")))
 
         # Skip empty / trivial notes
-        if not note.strip() or len(note.strip()) < 5 or note.strip().lower() == "nan":
+        if not is_auditable(note):
             print(f"[Row {row_num}/{total}] Skipping empty note by {staff}")
-            results.append({
+            result = {
                 "audit_score": "SKIPPED", "risk_level": "N/A",
                 "language_score": "", "detected_incidents": "",
                 "restrictive_practice_warning": "",
                 "coaching_sms": "", "reasoning": "Note empty or too short",
-            })
+                "trace_id": trace_id,
+            }
+            results[pos] = result
+            record_rollup(rollup_conn, row, pos, result)
             continue
 
         audit = audit_note(note, goals)
+        tracing.record_span(trace_id, "audit", picked_up, time.time(),
+                            verdict=str(audit.get("audit_score", "")))
 
         verdict = audit.get("audit_score", "UNKNOWN")
         print(f"[Row {row_num}/{total}] Auditing note by {staff}... Result: {verdict}")
 
+        if verdict == "CRITICAL" and first_critical is None:
+            first_critical = (time.perf_counter() - started, dispatched)
+
         incidents = audit.get("detected_incidents", [])
-        results.append({
+        result = {
             "audit_score": audit.get("audit_score", ""),
             "risk_level": audit.get("risk_level", ""),
             "language_score": audit.get("language_score", ""),
@@ -95,7 +204,10 @@ def main():
             "restrictive_practice_warning": audit.get("restrictive_practice_warning", ""),
             "coaching_sms": audit.get("coaching_sms", ""),
             "reasoning": audit.get("reasoning", ""),
-        })
+            "trace_id": trace_id,
+        }
+        results[pos] = result
+        record_rollup(rollup_conn, row, pos, result)
 
     # ── Build & Save Output ──────────────────────────────────────────────────
 
@@ -104,6 +216,7 @@ def main():
 
     output_path = Path(__file__).parent / "vigilant_audit_report.csv"
     output_df.to_csv(output_path, index=False)
+    rollup_conn.close()
 
     print(f"\n✅ Audit complete. Report saved to {output_path.name}")
     print(f"   Total rows:  {total}")
@@ -112,6 +225,11 @@ def main():
     print(f"   CRITICAL:    {(results_df['audit_score'] == 'CRITICAL').sum()}")
     print(f"   ERROR:       {(results_df['audit_score'] == 'ERROR').sum()}")
     print(f"   SKIPPED:     {(results_df['audit_score'] == 'SKIPPED').sum()}")
+    if first_critical:
+        seconds, dispatched = first_critical
+        print(f"   First CRITICAL: {seconds:.1f}s after start (note {dispatched} of {total} dispatched)")
+    if CASSETTE_MODE == "off":
+        print(f"   Rollup updated: {rollup.ROLLUP_DB.name} (query with: python3 rollup.py)")
 
 
 if __name__ == "__main__":
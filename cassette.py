@@ -0,0 +1,99 @@
+"""
+Audit Cassette — record/replay store for AEGIS Core LLM calls.
+
+Each entry is keyed on (model, system prompt, user message), so editing
+Audit.md or switching MODEL naturally produces a miss instead of replaying a
+stale answer. Used by audit.py (AUDIT_CASSETTE_MODE) and golden.py.
+
+A cassette is an append-only JSONL file, one entry per line, read once into
+memory. Recording appends a single line, so cost per call stays flat and a
+run killed mid-write loses at most the line being written.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+# Loaded cassettes, cached per path so replaying thousands of notes reads the file once.
+_cache = {}
+
+# ── Keys ─────────────────────────────────────────────────────────────────────
+
+def prompt_sha(system_prompt: str) -> str:
+    """Short fingerprint of a system prompt, stored alongside each entry."""
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def request_key(model: str, system_prompt: str, user_message: str) -> str:
+    """Deterministic key for a single LLM request."""
+    raw = "\0".join([model, prompt_sha(system_prompt), user_message])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# ── Load ─────────────────────────────────────────────────────────────────────
+
+def load(path: Path) -> dict:
+    """Load a cassette as {key: entry}. Returns empty dict if file doesn't exist.
+
+    Later lines win, so re-recording a request replaces it. A truncated last
+    line (from a run killed mid-write) is skipped; damage anywhere else raises.
+    """
+    path = Path(path)
+    if path not in _cache:
+        entries = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.read().split("\n")
+            for line_num, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError as e:
+                    if line_num == len(lines):
+                        print(f"⚠️  {path.name}: ignoring truncated last entry (interrupted recording)")
+                        continue
+                    raise ValueError(f"{path.name} line {line_num} is corrupt: {e}") from e
+                entries[entry["key"]] = entry
+        _cache[path] = entries
+    return _cache[path]
+
+# ── Record / Replay ──────────────────────────────────────────────────────────
+
+def lookup(path: Path, model: str, system_prompt: str, user_message: str):
+    """Return the recorded response text for this request, or None on a miss."""
+    entry = load(path).get(request_key(model, system_prompt, user_message))
+    return entry["response"] if entry else None
+
+
+def record(path: Path, model: str, system_prompt: str, user_message: str, response: str):
+    """Append a response to the cassette immediately, so an interrupted run keeps what it paid for."""
+    path = Path(path)
+    entries = load(path)
+    key = request_key(model, system_prompt, user_message)
+    entry = {
+        "key": key,
+        "model": model,
+        "prompt_sha": prompt_sha(system_prompt),
+        "request": user_message,
+        "response": response,
+        "recorded_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    if path.exists() and path.stat().st_size:
+        with open(path, "r+b") as f:
+            f.seek(-1, 2)
+            if f.read(1) != b"\n":
+                # Drop the truncated last line so it can't end up mid-file.
+                f.seek(0)
+                f.truncate(f.read().rfind(b"\n") + 1)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    entries[key] = entry
+
+
+def responses_by_request(path: Path) -> dict:
+    """Index a cassette as {user_message: entry}, keeping the most recent recording."""
+    indexed = {}
+    for entry in sorted(load(path).values(), key=lambda e: e.get("recorded_at", "")):
+        indexed[entry["request"]] = entry
+    return indexed
@@ -0,0 +1,147 @@
+"""
+Digest Scheduler — batches coaching SMS per worker within a time window.
+
+notify.py (DIGEST_MODE = True) queues flagged notes here instead of texting
+each one. Once a worker's oldest queued note has waited DIGEST_WINDOW_MINUTES,
+all of their notes go out as one combined SMS. CRITICAL findings can bypass
+the window (DIGEST_CRITICAL_BYPASS in notify.py).
+
+Usage:
+    python3 digest.py          # send digests whose window has elapsed
+    python3 digest.py --all    # send every queued digest now
+"""
+
+import argparse
+import re
+import time
+from pathlib import Path
+
+import jsonstore
+
+BASE_DIR = Path(__file__).parent
+QUEUE_FILE = BASE_DIR / "digest_queue.json"
+
+_ISSUE_RE = re.compile(r"ISSUE:\s*(.*?)(?:\s*FIX NEEDED:|$)", re.DOTALL)
+
+# ── Queue State ──────────────────────────────────────────────────────────────
+
+def load_queue() -> dict:
+    """Load queued digests as {phone: entry}. Returns empty dict if file doesn't exist."""
+    return jsonstore.read_json(QUEUE_FILE, {})
+
+
+def save_queue(queue: dict):
+    """Write the digest queue to JSON atomically. Hold jsonstore.locked(QUEUE_FILE) around load -> save."""
+    jsonstore.write_json(QUEUE_FILE, queue)
+
+
+def enqueue(queue: dict, phone: str, staff: str, item: dict, now: float = None):
+    """Add a flagged note to a worker's digest. Re-queuing the same shift replaces it."""
+    now = time.time() if now is None else now
+    entry = queue.setdefault(phone, {"staff_name": staff, "first_queued": int(now), "items": []})
+    entry["items"] = [i for i in entry["items"] if i["shift_id"] != item["shift_id"]]
+    entry["items"].append({**item, "queued_at": int(now)})
+
+
+def requeue(queue: dict, phone: str, entry: dict):
+    """Put back a digest that failed to send, merging with anything queued since."""
+    current = queue.get(phone)
+    if current is None:
+        queue[phone] = entry
+        return
+    newer = {i["shift_id"] for i in current["items"]}
+    current["items"] = [i for i in entry["items"] if i["shift_id"] not in newer] + current["items"]
+    current["first_queued"] = min(current["first_queued"], entry["first_queued"])
+
+
+def due_phones(queue: dict, window_seconds: int, now: float = None) -> list:
+    """Phones whose oldest queued note has waited at least the window."""
+    now = time.time() if now is None else now
+    return [phone for phone, entry in queue.items()
+            if now - entry["first_queued"] >= window_seconds]
+
+# ── Message Building ─────────────────────────────────────────────────────────
+
+def issue_summary(sms_body: str) -> str:
+    """First sentence of the ISSUE section of a coaching SMS."""
+    match = _ISSUE_RE.search(sms_body)
+    issue = (match.group(1) if match else sms_body).strip()
+    return re.split(r"(?<=[.!?])\s", issue, maxsplit=1)[0]
+
+
+def build_digest(staff: str, items: list) -> str:
+    """Combine a worker's queued notes into one SMS. A single note is sent as-is."""
+    if len(items) == 1:
+        return items[0]["sms_body"]
+
+    first_name = staff.split()[0] if staff.strip() else "there"
+    lines = [f"Hi {first_name}, Vigilant AI flagged {len(items)} of your notes."]
+    for n, item in enumerate(items, 1):
+        lines.append(f"{n}) {item['shift_id']} {item['client']} - {item['score']}: "
+                     f"{issue_summary(item['sms_body'])}")
+    if any(item["score"] == "CRITICAL" for item in items):
+        lines.append("URGENT: Please also call your Team Leader before your next shift.")
+    lines.append("Reply with the Shift ID and your corrected note for each.")
+    return "\n".join(lines)
+
+# ── Per-Shift Fix Tracking ───────────────────────────────────────────────────
+
+def resolve_reply_shift(record: dict, body: str) -> str:
+    """Work out which shift a reply is for.
+
+    Only shifts whose SMS actually went out (`sent_at`) are candidates: a
+    Shift ID named in the body, else the most recently sent awaiting shift.
+    Falls back to the record's latest shift_id when nothing was sent.
+    """
+    shifts = record.get("shifts", {})
+    awaiting = [sid for sid, s in shifts.items()
+                if s.get("status") == "AWAITING_REPLY" and s.get("sent_at")]
+    for shift_id in awaiting:
+        if re.search(rf"(?<![\w-]){re.escape(shift_id)}(?![\w-])", body, re.IGNORECASE):
+            return shift_id
+    if awaiting:
+        return max(awaiting, key=lambda sid: shifts[sid]["sent_at"])
+    return record.get("shift_id", "N/A")
+
+
+def apply_fix(record: dict, shift_id: str, body: str, now: float = None):
+    """Mark one shift fixed. The record only leaves AWAITING_REPLY once every shift has a fix."""
+    now = int(time.time() if now is None else now)
+    shift = record.get("shifts", {}).get(shift_id)
+    if shift is not None:
+        shift["status"] = "FIX_RECEIVED"
+        shift["fix_received"] = body
+        shift["fix_timestamp"] = now
+
+    still_awaiting = any(s.get("status") == "AWAITING_REPLY"
+                         for s in record.get("shifts", {}).values())
+    if not still_awaiting:
+        record["status"] = "FIX_RECEIVED"
+    record["fix_received"] = body
+    record["fix_timestamp"] = now
+
+# ── Main ─────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Send queued coaching SMS digests.")
+    parser.add_argument("--all", action="store_true", help="Flush every digest, ignoring the window")
+    args = parser.parse_args()
+
+    import notify  # Deferred: notify imports this module for queueing
+
+    if not load_queue():
+        print("No digests queued.")
+        return
+
+    sent, errors, before, after = notify.flush_digests(force=args.all)
+    print(f"{'='*50}")
+    print(f"Sent {sent} digest SMS. {len(load_queue())} worker(s) still queued.")
+    if sent:
+        print(f"Segments billed: {after} (saved {before - after} of {before})")
+    if errors:
+        print(f"Errors: {errors} (check logs).")
+    print(f"{'='*50}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+Overdue-Fix Escalation — reminders and team-leader escalations for unanswered coaching SMS.
+
+A flagged shift gets deadlines only once its coaching SMS has actually gone
+out: each stage is due at the shift's `sent_at` plus the SLA for its
+`audit_score`. Shifts that were never texted (cheap mode, still in a digest)
+are never chased. Deadlines live in a min-heap persisted to
+escalation_queue.json, so scheduling is O(log n), the next deadline is always
+at the top, and the queue survives restarts. Entries are checked against a
+fresh read of pending_fixes.json right before they fire; a shift that has been
+fixed or re-sent since is dropped then.
+
+notify.py, the webhook and this scheduler all update pending_fixes.json and
+escalation_queue.json, so every load -> save holds the file's jsonstore lock.
+
+Usage:
+    python3 escalation.py                 # run until stopped, sleeping until the next deadline
+    python3 escalation.py --once          # fire whatever is due now and exit (cron-friendly)
+    python3 escalation.py --rebuild       # rebuild the queue from pending_fixes.json
+    python3 escalation.py --simulate 96   # dry run: advance a simulated clock 96h, print what fires
+"""
+
+import argparse
+import heapq
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+import jsonstore
+
+# ── Configuration ────────────────────────────────────────────────────────────
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).parent
+QUEUE_FILE = BASE_DIR / "escalation_queue.json"
+PENDING_FILE = BASE_DIR / "pending_fixes.json"
+
+TEAM_LEADER_NUMBER = os.getenv("TEAM_LEADER_PHONE_NUMBER")
+
+HOUR = 3600
+
+# (stage, seconds after the coaching SMS was sent) per audit score.
+# HIGH-risk notes that weren't graded CRITICAL still follow the CRITICAL SLA.
+ESCALATION_SLA = {
+    "CRITICAL": [("reminder", 2 * HOUR), ("escalate", 4 * HOUR)],
+    "FAIL": [("reminder", 24 * HOUR), ("escalate", 72 * HOUR)],
+}
+
+# Delay before retrying a reminder/escalation whose SMS failed to send.
+RETRY_SECONDS = 300
+
+# Longest the daemon sleeps before checking the queue file for new entries.
+MAX_SLEEP_SECONDS = 60
+
+# ── Clocks ───────────────────────────────────────────────────────────────────
+
+class SystemClock:
+    def now(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class SimulatedClock:
+    """Clock that only moves when told to, for testing SLAs without waiting."""
+
+    def __init__(self, start: float = None):
+        self.current = time.time() if start is None else start
+
+    def now(self) -> float:
+        return self.current
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        self.current += seconds
+
+# ── Helpers ──────────────────────────────────────────────────────────────────
+
+def load_pending() -> dict:
+    return jsonstore.read_json(PENDING_FILE, {})
+
+
+def save_pending(pending: dict):
+    jsonstore.write_json(PENDING_FILE, pending)
+
+
+def sla_for(score: str, risk: str = "") -> list:
+    """Stages for a finding, or [] if it isn't escalated."""
+    if str(score).upper() == "CRITICAL" or str(risk).upper() == "HIGH":
+        return ESCALATION_SLA["CRITICAL"]
+    return ESCALATION_SLA.get(str(score).upper(), [])
+
+
+def _shift_entries(pending: dict):
+    """Yield (phone, shift_id, shift) for every flagged shift, including pre-digest records."""
+    for phone, record in pending.items():
+        shifts = record.get("shifts") or {record.get("shift_id", "N/A"): record}
+        for shift_id, shift in shifts.items():
+            yield phone, shift_id, shift
+
+
+def _find_shift(pending: dict, phone: str, shift_id: str):
+    """Return (record, shift) for a queued deadline, or (record, None) if it's gone."""
+    record = pending.get(phone)
+    shift = (record or {}).get("shifts", {}).get(shift_id)
+    if shift is None and record and record.get("shift_id") == shift_id:
+        shift = record
+    return record, shift
+
+
+def _mark_fired(phone: str, shift_id: str, stage: int, kind: str, fired_at: float):
+    """Record a fired stage on a fresh read of pending_fixes.json, leaving other updates alone."""
+    with jsonstore.locked(PENDING_FILE):
+        pending = load_pending()
+        _, shift = _find_shift(pending, phone, shift_id)
+        if shift is None:
+            return
+        shift["escalation_stage"] = stage
+        shift.setdefault("escalations", []).append({"stage": kind, "fired_at": int(fired_at)})
+        save_pending(pending)
+
+# ── Scheduler ────────────────────────────────────────────────────────────────
+
+class EscalationScheduler:
+    """Min-heap of [due, phone, shift_id, stage, sent_at] deadlines."""
+
+    def __init__(self, clock=None, queue_file: Path = None):
+        self.clock = clock or SystemClock()
+        self.queue_file = Path(queue_file or QUEUE_FILE)
+        self.heap = []
+        self._loaded_version = None
+        self._dry_pending = None
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+
+    def _file_version(self):
+        """Identity of the queue file's current contents; os.replace gives every write a new inode."""
+        if not self.queue_file.exists():
+            return None
+        stat = self.queue_file.stat()
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        self.heap = jsonstore.read_json(self.queue_file, [])
+        heapq.heapify(self.heap)  # Already a heap if we wrote it; guards against hand edits
+        self._loaded_version = self._file_version()
+
+    def _write(self):
+        jsonstore.write_json(self.queue_file, self.heap, indent=None)
+        self._loaded_version = self._file_version()
+
+    def load(self, persist: bool = True):
+        """Load the persisted heap, rebuilding it from pending_fixes.json on first run.
+
+        With persist=False (dry runs) a missing queue is rebuilt in memory only.
+        """
+        if not self.queue_file.exists():
+            self.rebuild(load_pending(), persist)
+            return
+        self._read()
+
+    def reload_if_changed(self):
+        """Pick up entries another process (notify.py) added since we last looked."""
+        if self.queue_file.exists() and self._file_version() != self._loaded_version:
+            self._read()
+
+    def rebuild(self, pending: dict, persist: bool = True):
+        """Recreate the heap from every sent shift still awaiting a reply."""
+        self.heap = []
+        for phone, shift_id, shift in _shift_entries(pending):
+            if shift.get("status") == "AWAITING_REPLY" and shift.get("sent_at"):
+                stage = shift.get("escalation_stage", -1) + 1
+                self._push(phone, shift_id, shift.get("audit_score", ""),
+                           shift.get("risk_level", ""), shift["sent_at"], stage)
+        if persist:
+            with jsonstore.locked(self.queue_file):
+                self._write()
+
+    # ── Scheduling ───────────────────────────────────────────────────────────
+
+    def _push(self, phone: str, shift_id: str, score: str, risk: str,
+              sent_at: float, stage: int = 0):
+        stages = sla_for(score, risk)
+        if stage < len(stages):
+            heapq.heappush(self.heap, [sent_at + stages[stage][1], phone, shift_id,
+                                       stage, sent_at])
+
+    def schedule(self, phone: str, shift_id: str, score: str, risk: str, sent_at: float):
+        """Queue the first stage for a shift whose coaching SMS just went out. O(log n)."""
+        self._push(phone, shift_id, score, risk, sent_at)
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    # ── Firing ───────────────────────────────────────────────────────────────
+
+    def _pop_due(self, now: float) -> list:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap))
+        return due
+
+    def run_due(self, send=None, dry_run: bool = False) -> list:
+        """Fire every deadline that has passed. Returns the actions taken.
+
+        `send(kind, to_number, body, staff)` delivers a message; it defaults to
+        notify.py's sender. With dry_run, nothing is sent or saved.
+
+        Due entries are claimed from the queue file under its lock, so another
+        scheduler process can't fire them too, and follow-up stages are merged
+        back in under the lock, keeping anything notify.py queued meanwhile.
+        """
+        now = self.clock.now()
+        # Nothing due at the top of the heap: don't touch the file at all.
+        # New entries from notify.py are picked up by reload_if_changed().
+        if self.next_due() is None or self.next_due() > now:
+            return []
+        if dry_run:
+            due = self._pop_due(now)
+            if self._dry_pending is None:
+                self._dry_pending = load_pending()
+        else:
+            with jsonstore.locked(self.queue_file):
+                self.reload_if_changed()  # Another process may have fired or added entries
+                due = self._pop_due(now)
+                if due:
+                    self._write()
+        if not due:
+            return []
+
+        send = send or _send_via_notify
+        actions = []
+        follow_ups = []
+
+        for due_at, phone, shift_id, stage, sent_at in due:
+            # Fresh read per deadline: a fix may have arrived while earlier ones were sending.
+            pending = self._dry_pending if dry_run else load_pending()
+            record, shift = _find_shift(pending, phone, shift_id)
+
+            # Stale: fixed, re-sent with a newer sent_at, or already fired before a restart.
+            if (shift is None or shift.get("status") != "AWAITING_REPLY"
+                    or shift.get("sent_at") != sent_at
+                    or shift.get("escalation_stage", -1) >= stage):
+                continue
+
+            stages = sla_for(shift.get("audit_score", ""), shift.get("risk_level", ""))
+            kind = stages[stage][0]
+            staff = record.get("staff_name", "Unknown")
+            client = shift.get("client", record.get("client", "N/A"))
+            hours = (now - sent_at) / HOUR
+
+            if kind == "reminder":
+                to_number = phone
+                body = (f"Hi {staff.split()[0]}, reminder: Vigilant AI is still waiting on your "
+                        f"corrected note for {client} ({shift_id}). Reply to this message with "
+                        f"your corrected note.")
+            else:
+                to_number = TEAM_LEADER_NUMBER
+                body = (f"ESCALATION: {staff} has not replied to a {shift.get('audit_score')} "
+                        f"finding for {client} ({shift_id}) sent {hours:.0f}h ago. "
+                        f"Please follow up before their next shift.")
+
+            if dry_run:
+                shift["escalation_stage"] = stage
+                shift.setdefault("escalations", []).append({"stage": kind, "fired_at": int(now)})
+            else:
+                if to_number:
+                    try:
+                        send(kind, to_number, body, staff)
+                    except Exception as e:
+                        print(f"[ERROR] Failed to send {kind} for {staff} ({shift_id}): {e} — retrying later")
+                        follow_ups.append([now + RETRY_SECONDS, phone, shift_id, stage, sent_at])
+                        continue
+                else:
+                    print(f"[ESCALATE] TEAM_LEADER_PHONE_NUMBER not set — "
+                          f"escalation for {staff} ({shift_id}) logged only")
+                _mark_fired(phone, shift_id, stage, kind, now)
+
+            actions.append({"kind": kind, "staff": staff, "phone": phone, "shift_id": shift_id,
+                            "to": to_number, "body": body, "due": due_at, "fired_at": now})
+            if stage + 1 < len(stages):
+                follow_ups.append([sent_at + stages[stage + 1][1], phone, shift_id, stage + 1, sent_at])
+
+        if dry_run:
+            for entry in follow_ups:
+                heapq.heappush(self.heap, entry)
+        else:
+            with jsonstore.locked(self.queue_file):
+                self.reload_if_changed()
+                for entry in follow_ups:
+                    heapq.heappush(self.heap, entry)
+                self._write()
+        return actions
+
+    def run_forever(self, send=None):
+        """Sleep until the next deadline (or MAX_SLEEP_SECONDS), fire, repeat."""
+        while True:
+            self.reload_if_changed()
+            for action in self.run_due(send):
+                print(f"[{action['kind'].upper()}] {action['staff']} ({action['shift_id']}) -> {action['to']}")
+            due = self.next_due()
+            wait = MAX_SLEEP_SECONDS if due is None else min(max(due - self.clock.now(), 0), MAX_SLEEP_SECONDS)
+            self.clock.sleep(wait)
+
+
+def _send_via_notify(kind: str, to_number: str, body: str, staff: str):
+    import notify  # Deferred: notify imports this module for scheduling
+
+    destination = notify.route_number(to_number)
+    body, _, _ = notify.optimize_sms(body)
+    label = staff if kind == "reminder" else f"TEAM_LEADER re {staff}"
+    sid = notify.send_sms(destination, body, staff_name=label)
+    notify.log_sms(label, destination, body, sid, notify.BASE_DIR / "sms_history.log")
+
+
+def schedule_pending(entries: list):
+    """Add (phone, shift_id, score, risk, sent_at) entries to the persisted queue.
+
+    One locked read-push-write per call, so callers batch a whole run's entries.
+    """
+    if not entries:
+        return
+    scheduler = EscalationScheduler()
+    if not scheduler.queue_file.exists():
+        scheduler.rebuild(load_pending())  # First run: picks up these entries and any older ones
+        return
+    with jsonstore.locked(scheduler.queue_file):
+        scheduler._read()
+        for entry in entries:
+            scheduler.schedule(*entry)
+        scheduler._write()
+
+# ── Main ─────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Escalate overdue note fixes.")
+    parser.add_argument("--once", action="store_true", help="Fire due deadlines and exit")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the queue from pending_fixes.json")
+    parser.add_argument("--simulate", type=float, metavar="HOURS",
+                        help="Dry run on a simulated clock advanced this many hours")
+    parser.add_argument("--step", type=float, default=15, metavar="MINUTES",
+                        help="Simulated clock step (default 15)")
+    args = parser.parse_args()
+
+    if args.simulate is not None:
+        clock = SimulatedClock()
+        scheduler = EscalationScheduler(clock)
+        scheduler.load(persist=False)
+        start = clock.now()
+        end = start + args.simulate * HOUR
+        print(f"Simulating {args.simulate:g}h over {len(scheduler.heap)} queued deadline(s) (dry run)\n")
+        fired = 0
+        while clock.now() <= end:
+            for a in scheduler.run_due(dry_run=True):
+                fired += 1
+                hours_in = (a["fired_at"] - start) / HOUR
+                print(f"  +{hours_in:5.1f}h  [{a['kind'].upper():8s}] {a['staff']} ({a['shift_id']}) "
+                      f"-> {a['to'] or 'TEAM LEADER (unset)'}")
+            clock.advance(args.step * 60)
+        print(f"\n{fired} action(s) would fire. Nothing was sent or saved.")
+        return
+
+    scheduler = EscalationScheduler()
+    if args.rebuild:
+        scheduler.rebuild(load_pending())
+        print(f"Rebuilt {scheduler.queue_file.name}: {len(scheduler.heap)} deadline(s).")
+        return
+
+    scheduler.load()
+    if args.once:
+        actions = scheduler.run_due()
+        for a in actions:
+            print(f"[{a['kind'].upper()}] {a['staff']} ({a['shift_id']}) -> {a['to']}")
+        print(f"{len(actions)} action(s) fired. {len(scheduler.heap)} deadline(s) queued.")
+        return
+
+    print(f"Escalation scheduler running — {len(scheduler.heap)} deadline(s) queued. Ctrl+C to stop.")
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Golden-Set Runner — compare two recorded audit runs offline.
+
+Record a baseline and a candidate once (e.g. before and after an Audit.md or
+MODEL change), then diff verdicts, risk levels and language scores without
+any network calls:
+
+    AUDIT_CASSETTE_MODE=record AUDIT_CASSETTE_FILE=baseline.jsonl python3 audit.py
+    # ...edit Audit.md...
+    AUDIT_CASSETTE_MODE=record AUDIT_CASSETTE_FILE=candidate.jsonl python3 audit.py
+    python3 golden.py baseline.jsonl candidate.jsonl --export shiftcare_messy_export.csv
+"""
+
+import argparse
+import csv
+import json
+import time
+import pandas as pd
+from pathlib import Path
+
+import cassette
+from audit import build_user_message, is_auditable, parse_audit_response, row_inputs
+
+BASE_DIR = Path(__file__).parent
+
+# Language scores within this many points are treated as agreeing.
+DEFAULT_SCORE_TOLERANCE = 10
+
+# ── Loading ──────────────────────────────────────────────────────────────────
+
+def parse_entry(entry: dict) -> dict:
+    """Parse a cassette entry the same way audit_note() does."""
+    try:
+        return parse_audit_response(entry["response"])
+    except json.JSONDecodeError:
+        return {"audit_score": "ERROR", "risk_level": "ERROR", "language_score": 0}
+
+
+def golden_rows(export_csv: Path) -> list:
+    """Return (label, user_message) pairs for every auditable row in an export."""
+    rows = []
+    for idx, row in pd.read_csv(export_csv).iterrows():
+        note, goals = row_inputs(row)
+        if not is_auditable(note):
+            continue
+        label = str(row.get("Shift ID", f"Row-{idx + 1}"))
+        rows.append((label, build_user_message(note, goals)))
+    return rows
+
+# ── Comparison ───────────────────────────────────────────────────────────────
+
+def compare(baseline: dict, candidate: dict, rows: list, tolerance: int) -> dict:
+    """Compare two {user_message: entry} indexes over the given (label, message) rows."""
+    stats = {"compared": 0, "missing": 0, "verdict": 0, "risk": 0, "language": 0}
+    flipped = []
+
+    for label, message in rows:
+        if message not in baseline or message not in candidate:
+            stats["missing"] += 1
+            continue
+
+        before = parse_entry(baseline[message])
+        after = parse_entry(candidate[message])
+        stats["compared"] += 1
+
+        try:
+            score_delta = int(after.get("language_score", 0)) - int(before.get("language_score", 0))
+        except (TypeError, ValueError):
+            score_delta = None
+
+        verdict_same = before.get("audit_score") == after.get("audit_score")
+        risk_same = before.get("risk_level") == after.get("risk_level")
+        language_same = score_delta is not None and abs(score_delta) <= tolerance
+
+        stats["verdict"] += verdict_same
+        stats["risk"] += risk_same
+        stats["language"] += language_same
+
+        if not (verdict_same and risk_same and language_same):
+            flipped.append({
+                "row": label,
+                "verdict_before": str(before.get("audit_score", "")),
+                "verdict_after": str(after.get("audit_score", "")),
+                "risk_before": str(before.get("risk_level", "")),
+                "risk_after": str(after.get("risk_level", "")),
+                "language_before": before.get("language_score", ""),
+                "language_after": after.get("language_score", ""),
+                "language_delta": "" if score_delta is None else score_delta,
+            })
+
+    return {"stats": stats, "flipped": flipped}
+
+# ── Main ─────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two recorded audit runs offline.")
+    parser.add_argument("baseline", type=Path, help="Cassette recorded before the change")
+    parser.add_argument("candidate", type=Path, help="Cassette recorded after the change")
+    parser.add_argument("--export", type=Path,
+                        help="ShiftCare export defining the golden set (default: every request in both cassettes)")
+    parser.add_argument("--tolerance", type=int, default=DEFAULT_SCORE_TOLERANCE,
+                        help=f"Language score difference still counted as agreement (default {DEFAULT_SCORE_TOLERANCE})")
+    parser.add_argument("--out", type=Path, default=BASE_DIR / "golden_diff.csv",
+                        help="Where to write the flipped rows")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    baseline = cassette.responses_by_request(args.baseline)
+    candidate = cassette.responses_by_request(args.candidate)
+
+    if args.export:
+        rows = golden_rows(args.export)
+    else:
+        shared = [m for m in baseline if m in candidate]
+        rows = [(f"Req-{i + 1}", m) for i, m in enumerate(shared)]
+
+    result = compare(baseline, candidate, rows, args.tolerance)
+    stats, flipped = result["stats"], result["flipped"]
+    elapsed = time.perf_counter() - started
+
+    if flipped:
+        with open(args.out, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(flipped[0].keys()))
+            writer.writeheader()
+            writer.writerows(flipped)
+
+    compared = stats["compared"] or 1
+    print(f"{'='*50}")
+    print(f"Golden set: {args.baseline.name} -> {args.candidate.name}")
+    print(f"Compared {stats['compared']} note(s) in {elapsed:.2f}s "
+          f"({stats['missing']} missing from a cassette).")
+    print(f"  Verdict agreement:   {stats['verdict'] / compared:6.1%}")
+    print(f"  Risk agreement:      {stats['risk'] / compared:6.1%}")
+    print(f"  Language agreement:  {stats['language'] / compared:6.1%}  (±{args.tolerance})")
+    print(f"Flipped rows: {len(flipped)}")
+    for f in flipped[:20]:
+        print(f"  {f['row']:10s} {f['verdict_before']:>8s} -> {f['verdict_after']:<8s} "
+              f"{f['risk_before']:>6s} -> {f['risk_after']:<6s} "
+              f"lang {f['language_before']} -> {f['language_after']}")
+    if len(flipped) > 20:
+        print(f"  ... {len(flipped) - 20} more")
+    if flipped:
+        print(f"Full diff saved to {args.out.name}")
+    print(f"{'='*50}")
+
+
+if __name__ == "__main__":
+    main()
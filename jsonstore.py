@@ -0,0 +1,65 @@
+"""
+JSON State Files — atomic writes and cross-process locking.
+
+pending_fixes.json, digest_queue.json and escalation_queue.json are shared by
+notify.py, the webhook, digest.py and escalation.py, which can all run at once.
+Writes go to a temp file in the same directory and are swapped in with
+os.replace, so readers never see a half-written file. Anything that does
+load -> mutate -> save holds `locked(path)` for the whole sequence, so
+concurrent updates can't overwrite each other.
+
+Usage:
+    with jsonstore.locked(PENDING_FILE):
+        pending = jsonstore.read_json(PENDING_FILE, {})
+        pending[phone]["status"] = "FIX_RECEIVED"
+        jsonstore.write_json(PENDING_FILE, pending)
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# ── Locking ──────────────────────────────────────────────────────────────────
+
+@contextmanager
+def locked(path: Path):
+    """Hold an exclusive lock on `path` (via a sibling .lock file) across processes and threads."""
+    path = Path(path)
+    lock_path = path.with_name(path.name + ".lock")
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# ── Read / Write ─────────────────────────────────────────────────────────────
+
+def read_json(path: Path, default=None):
+    """Load a JSON file. Returns `default` if the file doesn't exist."""
+    path = Path(path)
+    if not path.exists():
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path: Path, data, indent: int = 2):
+    """Write JSON atomically: temp file in the same directory, then os.replace."""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
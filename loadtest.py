@@ -0,0 +1,272 @@
+"""
+Webhook Load Test — fires Twilio-style SMS replies at /sms-reply.
+
+Sweeps a list of concurrency levels and reports throughput, p50/p95/p99
+latency and errors for each. Replies mix numbers from pending_fixes.json
+(the full fix path: lookup, state save, rollup, logs) with unknown numbers
+(the cheap "no pending audits" path).
+
+Usage:
+    # Start an isolated copy of the server per run (default: flask) and compare servers
+    python3 loadtest.py
+    python3 loadtest.py --serve waitress --threads 8
+    python3 loadtest.py --serve gunicorn --workers 4
+
+    # Against a server you started yourself. Replies from known numbers WILL
+    # mark that server's pending fixes FIX_RECEIVED and write its rollup and logs.
+    python3 loadtest.py --url http://127.0.0.1:5001/sms-reply
+
+--serve copies the project's .py files plus pending_fixes.json and
+compliance_rollup.db into a temporary directory, so load-test replies never
+touch the real state or logs but still pay the real per-reply state costs.
+"""
+
+import argparse
+import importlib.util
+import json
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from tracing import percentile
+
+BASE_DIR = Path(__file__).parent
+PENDING_FILE = BASE_DIR / "pending_fixes.json"
+ROLLUP_DB = BASE_DIR / "compliance_rollup.db"
+
+SAMPLE_REPLIES = [
+    "Noah tripped on the hallway rug at 2pm. He had a small red mark on his right knee. "
+    "First aid was applied. Incident report submitted. House Manager notified at 2:15pm.",
+    "Liam practised his Money Handling goal at Coles. He used the self-checkout and paid "
+    "for his items independently. He appeared confident and happy.",
+    "Olivia became upset at 4pm. I offered her a choice between water and juice. We used "
+    "her calm-down breathing technique together. She settled after 10 minutes.",
+    "SC-1004 updated: Liam chose to go to the park to work on his Community Access goal.",
+    "ok",
+]
+
+# ── Request Generation ───────────────────────────────────────────────────────
+
+def known_numbers() -> list:
+    """Phone numbers with pending fixes, read the same way webhooks.py does."""
+    if not PENDING_FILE.exists():
+        return []
+    with open(PENDING_FILE, "r", encoding="utf-8") as f:
+        return list(json.load(f).keys())
+
+
+def twilio_form(sender: str, seq: int) -> bytes:
+    """Form body matching an inbound Twilio Messaging webhook."""
+    body = random.choice(SAMPLE_REPLIES)
+    return urllib.parse.urlencode({
+        "ToCountry": "AU",
+        "SmsMessageSid": f"SM{seq:032x}",
+        "NumMedia": "0",
+        "SmsSid": f"SM{seq:032x}",
+        "SmsStatus": "received",
+        "Body": body,
+        "FromCountry": "AU",
+        "To": "+61400000000",
+        "NumSegments": "1",
+        "MessageSid": f"SM{seq:032x}",
+        "AccountSid": "AC" + "0" * 32,
+        "From": sender,
+        "ApiVersion": "2010-04-01",
+    }).encode("utf-8")
+
+
+def build_requests(count: int, known: list, known_ratio: float) -> list:
+    """Pre-build every request body so generation cost stays out of the timings."""
+    payloads = []
+    for seq in range(count):
+        if known and random.random() < known_ratio:
+            sender = random.choice(known)
+        else:
+            sender = f"+6149{random.randint(0, 9999999):07d}"
+        payloads.append(twilio_form(sender, seq))
+    return payloads
+
+# ── Load Generation ──────────────────────────────────────────────────────────
+
+def post(url: str, payload: bytes, timeout: float) -> tuple:
+    """POST one reply. Returns (latency_seconds, ok)."""
+    req = urllib.request.Request(url, data=payload, method="POST", headers={
+        "Content-Type": "application/x-www-form-urlencoded",
+        "User-Agent": "TwilioProxy/1.1",
+    })
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            ok = resp.status == 200
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def run_level(url: str, payloads: list, concurrency: int, timeout: float) -> dict:
+    """Fire every payload with `concurrency` requests in flight."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda p: post(url, p, timeout), payloads))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(lat for lat, ok in results if ok)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50) if latencies else None,
+        "p95": percentile(latencies, 95) if latencies else None,
+        "p99": percentile(latencies, 99) if latencies else None,
+    }
+
+# ── Server Management ────────────────────────────────────────────────────────
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, proc: subprocess.Popen, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited early (code {proc.returncode}).")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not start listening on port {port} within {timeout:.0f}s.")
+
+
+def start_server(kind: str, port: int, workers: int, threads: int) -> tuple:
+    """Launch webhooks.py from an isolated copy of the project. Returns (process, temp_dir)."""
+    if importlib.util.find_spec(kind) is None:
+        raise RuntimeError(f"{kind} package not installed. Install it or pick another --serve option.")
+
+    workdir = Path(tempfile.mkdtemp(prefix="vigilant-loadtest-"))
+    for path in BASE_DIR.glob("*.py"):
+        shutil.copy(path, workdir)
+    if PENDING_FILE.exists():
+        shutil.copy(PENDING_FILE, workdir)
+    if ROLLUP_DB.exists():
+        # Backup API rather than a file copy, so rows still in the WAL come along.
+        src = sqlite3.connect(str(ROLLUP_DB))
+        dst = sqlite3.connect(str(workdir / ROLLUP_DB.name))
+        with dst:
+            src.backup(dst)
+        src.close()
+        dst.close()
+
+    if kind == "flask":
+        cmd = [sys.executable, "-m", "flask", "--app", "webhooks", "run",
+               "--host", "127.0.0.1", "--port", str(port), "--with-threads"]
+    elif kind == "waitress":
+        cmd = [sys.executable, "-m", "waitress", "--host=127.0.0.1", f"--port={port}",
+               f"--threads={threads}", "webhooks:app"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}",
+               "-w", str(workers), "--threads", str(threads), "webhooks:app"]
+
+    proc = subprocess.Popen(cmd, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_for_port(port, proc)
+    except RuntimeError:
+        proc.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    return proc, workdir
+
+# ── Main ─────────────────────────────────────────────────────────────────────
+
+def _ms(value) -> str:
+    return f"{value * 1000:.1f}" if value is not None else "—"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the /sms-reply webhook.")
+    parser.add_argument("--url",
+                        help="Test a server you started yourself instead (writes to ITS real state)")
+    parser.add_argument("--serve", choices=("flask", "waitress", "gunicorn"),
+                        help="Start an isolated server of this kind for the run (default: flask)")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=4, help="waitress/gunicorn threads per worker")
+    parser.add_argument("--concurrency", default="1,4,16,64",
+                        help="Comma-separated concurrency levels to sweep")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--known-ratio", type=float, default=0.7,
+                        help="Share of replies from numbers in pending_fixes.json")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for reproducible traffic")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    known = known_numbers()
+
+    if args.url and args.serve:
+        parser.error("use either --url or --serve, not both")
+    if not args.url:
+        args.serve = args.serve or "flask"
+
+    proc = workdir = None
+    url = args.url
+    if args.url:
+        print(f"⚠️  Testing an external server: replies from {len(known)} known number(s) will mark "
+              f"its pending fixes FIX_RECEIVED and write its rollup, trace and fix logs.")
+        print(f"   Use --serve (the default) to test an isolated copy instead.\n")
+    else:
+        port = _free_port()
+        try:
+            proc, workdir = start_server(args.serve, port, args.workers, args.threads)
+        except RuntimeError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
+        url = f"http://127.0.0.1:{port}/sms-reply"
+
+    label = args.serve or "external"
+    print(f"{'='*72}")
+    print(f"  /sms-reply load test — server: {label}  ({url})")
+    print(f"  {args.requests} requests/level, {len(known)} known number(s), "
+          f"{args.known_ratio:.0%} known traffic")
+    print(f"{'='*72}")
+    print(f"  {'Conc':>5s} {'Reqs':>6s} {'Req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} "
+          f"{'p99 ms':>8s} {'Errors':>7s}")
+
+    try:
+        # Warm up imports and the first JSON load so level 1 isn't skewed.
+        run_level(url, build_requests(5, known, args.known_ratio), 1, args.timeout)
+        for concurrency in levels:
+            payloads = build_requests(args.requests, known, args.known_ratio)
+            r = run_level(url, payloads, concurrency, args.timeout)
+            print(f"  {r['concurrency']:5d} {r['requests']:6d} {r['throughput']:8.1f} "
+                  f"{_ms(r['p50']):>8s} {_ms(r['p95']):>8s} {_ms(r['p99']):>8s} {r['errors']:7d}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'='*72}")
+
+
+if __name__ == "__main__":
+    main()
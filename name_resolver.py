@@ -0,0 +1,166 @@
+"""
+Staff Name Resolver — matches messy ShiftCare 'Staff Member' values to staff_list.csv.
+
+Handles case, stray spaces and punctuation ("sarah  jenkins"), initials
+("S. Jenkins"), swapped order ("Jenkins, Sarah") and one-letter typos. Lookups go
+exact-normalised first, then through a trigram inverted index, so only staff
+sharing trigrams with the query are scored.
+
+Every lookup returns a confidence score. Close calls come back AMBIGUOUS (or
+UNMATCHED) for a human to review instead of being silently dropped.
+"""
+
+import re
+import unicodedata
+
+# Accept the best candidate at or above this confidence...
+ACCEPT_CONFIDENCE = 0.85
+# ...and only if it beats the runner-up (a different person) by this much.
+ACCEPT_MARGIN = 0.10
+# Below this, the best candidate isn't worth showing a reviewer.
+REVIEW_CONFIDENCE = 0.50
+
+# Candidates scored in full per lookup, after trigram counting.
+MAX_CANDIDATES = 25
+# Trigrams shared by more than this share of staff carry little signal and are
+# skipped during candidate generation (e.g. " ja" in a big list of Jameses).
+STOP_TRIGRAM_SHARE = 0.05
+
+# ── Normalisation ────────────────────────────────────────────────────────────
+
+def normalize_name(name: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return " ".join(text.split())
+
+
+def trigrams(normalized: str) -> set:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _one_edit_apart(a: str, b: str) -> bool:
+    """True for a single insert, delete, substitution or adjacent swap."""
+    if abs(len(a) - len(b)) > 1 or a == b:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diffs) == 1 or (len(diffs) == 2 and diffs[1] == diffs[0] + 1
+                                   and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    short, long_ = (a, b) if len(a) < len(b) else (b, a)
+    return any(long_[:i] + long_[i + 1:] == short for i in range(len(long_)))
+
+
+def _token_weight(token: str, cand: str) -> float:
+    """How well one query token matches one staff-name token (0 if not at all)."""
+    if token == cand:
+        return 1.0
+    if len(token) == 1 and cand.startswith(token):
+        return 0.9  # Initial: "s" for "sarah"
+    if min(len(token), len(cand)) >= 3 and _one_edit_apart(token, cand):
+        return 0.9  # Typo: "sarha" for "sarah"
+    return 0.0
+
+
+def _token_score(query_tokens: list, candidate_tokens: list) -> float:
+    """Order-insensitive token match allowing initials and one-letter typos."""
+    if not query_tokens or not candidate_tokens:
+        return 0.0
+    remaining = list(candidate_tokens)
+    matched = 0.0
+    # Full tokens first, so an initial can't steal a token a full word needed.
+    for token in sorted(query_tokens, key=len, reverse=True):
+        weights = [_token_weight(token, cand) for cand in remaining]
+        if weights and max(weights) > 0:
+            best = weights.index(max(weights))
+            matched += weights[best]
+            del remaining[best]
+    return matched / max(len(query_tokens), len(candidate_tokens))
+
+# ── Resolver ─────────────────────────────────────────────────────────────────
+
+class StaffResolver:
+    """Trigram-indexed lookup from raw staff names to phone numbers."""
+
+    def __init__(self, staff: list):
+        """`staff` is an iterable of (name, number) rows; duplicate names are kept."""
+        self.names = []
+        self.numbers = []
+        self.normalized = []
+        self.grams = []
+        self.exact = {}
+        self.index = {}
+        self._cache = {}
+
+        for name, number in staff:
+            idx = len(self.names)
+            norm = normalize_name(name)
+            self.names.append(name)
+            self.numbers.append(number)
+            self.normalized.append(norm)
+            self.grams.append(trigrams(norm))
+            self.exact.setdefault(norm, []).append(idx)
+            for gram in self.grams[idx]:
+                self.index.setdefault(gram, []).append(idx)
+
+        self.stop_size = max(int(len(self.names) * STOP_TRIGRAM_SHARE), 50)
+
+    def _candidates(self, grams: set) -> list:
+        """Staff sharing the most trigrams with the query, skipping near-universal trigrams."""
+        counts = {}
+        postings = [self.index[g] for g in grams if g in self.index]
+        selective = [p for p in postings if len(p) <= self.stop_size] or postings
+        for posting in selective:
+            for idx in posting:
+                counts[idx] = counts.get(idx, 0) + 1
+        return sorted(counts, key=lambda i: -counts[i])[:MAX_CANDIDATES]
+
+    def _score(self, norm: str, grams: set, idx: int) -> float:
+        shared = len(grams & self.grams[idx])
+        dice = 2 * shared / (len(grams) + len(self.grams[idx]))
+        tokens = _token_score(norm.split(), self.normalized[idx].split())
+        return round(max(dice, tokens), 3)
+
+    def resolve(self, raw_name: str) -> dict:
+        """Match a raw name. Returns name, number, confidence, status and ranked candidates.
+
+        status is EXACT, MATCHED (fuzzy but confident), AMBIGUOUS or UNMATCHED.
+        """
+        if raw_name in self._cache:
+            return self._cache[raw_name]
+
+        norm = normalize_name(raw_name)
+        result = {"query": raw_name, "name": None, "number": None,
+                  "confidence": 0.0, "status": "UNMATCHED", "candidates": []}
+
+        exact = self.exact.get(norm, []) if norm else []
+        if exact and len({self.numbers[i] for i in exact}) == 1:
+            idx = exact[0]
+            result.update(name=self.names[idx], number=self.numbers[idx],
+                          confidence=1.0, status="EXACT")
+        elif norm:
+            grams = trigrams(norm)
+            scores = {idx: self._score(norm, grams, idx) for idx in self._candidates(grams)}
+            ranked, seen_numbers = [], set()
+            for idx in sorted(scores, key=lambda i: -scores[i]):
+                # Duplicate rows for the same person aren't competing matches.
+                if self.numbers[idx] in seen_numbers:
+                    continue
+                seen_numbers.add(self.numbers[idx])
+                ranked.append({"name": self.names[idx], "number": self.numbers[idx],
+                               "confidence": scores[idx]})
+
+            result["candidates"] = ranked[:5]
+            if ranked:
+                best = ranked[0]
+                runner_up = ranked[1]["confidence"] if len(ranked) > 1 else 0.0
+                result["confidence"] = best["confidence"]
+                if best["confidence"] >= ACCEPT_CONFIDENCE and best["confidence"] - runner_up >= ACCEPT_MARGIN:
+                    result.update(name=best["name"], number=best["number"], status="MATCHED")
+                elif best["confidence"] >= REVIEW_CONFIDENCE:
+                    result["status"] = "AMBIGUOUS"
+
+        self._cache[raw_name] = result
+        return result
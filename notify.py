@@ -1,4 +1,5 @@
 import os
+import re
 import json
 import time
 import pandas as pd
@@ -6,6 +7,13 @@ from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
 
+import digest
+import escalation
+import jsonstore
+import rollup
+import tracing
+from name_resolver import StaffResolver
+
 try:
     from twilio.rest import Client
 except ImportError:
@@ -35,9 +43,32 @@ SIMULATOR_MODE = True
 if SIMULATOR_MODE:
     SAFETY_MODE = False
 
+# When True, coaching SMS are transliterated to GSM-7 and compacted to fit
+# SMS_SEGMENT_BUDGET before sending. One em-dash or curly quote forces UCS-2,
+# which cuts a segment from 153 to 67 characters.
+SMS_OPTIMIZE = True
+SMS_SEGMENT_BUDGET = 3
+# Compaction never cuts an ISSUE / FIX NEEDED / REPLY TIP section below this
+# many words, even if the message ends up over budget.
+SMS_MIN_SECTION_WORDS = 8
+# Same floor for each item's issue summary in a digest.
+SMS_MIN_SUMMARY_WORDS = 4
+
+# When True, flagged notes are queued per worker (digest_queue.json) and sent as
+# one combined SMS once the worker's oldest note has waited DIGEST_WINDOW_MINUTES.
+# Run digest.py (e.g. from cron) to flush digests between notify runs.
+# Ignored when TEST_CHEAP_MODE is on.
+DIGEST_MODE = False
+DIGEST_WINDOW_MINUTES = 60
+DIGEST_SEGMENT_BUDGET = 4
+
+# When True, CRITICAL findings skip the digest window and are sent immediately.
+DIGEST_CRITICAL_BYPASS = True
+
 BASE_DIR = Path(__file__).parent
 PENDING_FILE = BASE_DIR / "pending_fixes.json"
 OUTBOX_FILE = BASE_DIR / "sms_outbox.json"
+NAME_REVIEW_FILE = BASE_DIR / "name_review.json"
 
 # Lazy Twilio client — only created when actually sending real SMS
 _twilio_client = None
@@ -62,10 +93,180 @@ def to_e164(number: str) -> str:
     return "+61" + number
 
 
-def build_phonebook(staff_csv: Path) -> dict:
-    """Load staff_list.csv into a {Full Name: Mobile Number} dictionary."""
+def load_staff(staff_csv: Path) -> list:
+    """Load staff_list.csv as (Full Name, Mobile Number) rows.
+
+    Kept as rows, not a name-keyed dict, so two staff who share a name both
+    reach the resolver and come back AMBIGUOUS instead of one silently winning.
+    """
     df = pd.read_csv(staff_csv)
-    return dict(zip(df["Full Name"].str.strip(), df["Mobile Number"].astype(str).str.strip()))
+    return list(zip(df["Full Name"].str.strip(), df["Mobile Number"].astype(str).str.strip()))
+
+
+def save_name_reviews(reviews: list) -> int:
+    """Append unresolved staff names to name_review.json for a human to match up.
+
+    Rows already listed (same shift_id and staff_member) are skipped, so
+    re-running notify.py on the same report doesn't duplicate them.
+    Returns the number of new entries.
+    """
+    with jsonstore.locked(NAME_REVIEW_FILE):
+        existing = jsonstore.read_json(NAME_REVIEW_FILE, [])
+        seen = {(r.get("shift_id"), r.get("staff_member")) for r in existing}
+        new = []
+        for review in reviews:
+            key = (review["shift_id"], review["staff_member"])
+            if key not in seen:
+                seen.add(key)
+                new.append(review)
+        if new:
+            jsonstore.write_json(NAME_REVIEW_FILE, existing + new)
+    return len(new)
+
+
+# ── SMS Encoding ─────────────────────────────────────────────────────────────
+
+# GSM 03.38 basic character set (1 septet each) and extension table (2 septets each).
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+# Substitutions that keep the meaning of the text intact. Anything not listed
+# here is left alone, so the message falls back to UCS-2 rather than losing content.
+GSM7_TRANSLITERATIONS = {
+    "—": "-", "–": "-", "‒": "-", "―": "-", "−": "-",
+    "‘": "'", "’": "'", "‚": "'", "′": "'",
+    "“": '"', "”": '"', "„": '"', "″": '"',
+    "…": "...", "•": "-", "×": "x",
+    "\u00a0": " ", "\u2009": " ", "\u202f": " ", "\u2002": " ", "\u2003": " ",
+    "\u200b": "", "\ufeff": "",
+    "\t": " ",
+}
+
+SECTION_LABELS = ("ISSUE:", "FIX NEEDED:", "REPLY TIP:")
+_SECTION_RE = re.compile(r"(ISSUE:|FIX NEEDED:|REPLY TIP:)")
+_CLOSING_RE = re.compile(r"\s*(URGENT:|Reply to this message|Reply with)")
+# One item line of a digest (see digest.build_digest): prefix, then the issue summary.
+_DIGEST_ITEM_RE = re.compile(r"^(\d+\) \S+ .*? - [A-Z]+: )(.*)$")
+
+# Boilerplate from Audit.md section 5, shortened without dropping the instruction.
+SMS_SHORTHAND = {
+    "Reply to this message with your corrected note.": "Reply with your corrected note.",
+    "URGENT: Please also call your Team Leader before your next shift.":
+        "URGENT: Call your Team Leader before your next shift.",
+}
+
+
+def is_gsm7(text: str) -> bool:
+    """True if the text can be sent in the GSM-7 alphabet."""
+    return all(ch in GSM7_BASIC or ch in GSM7_EXTENDED for ch in text)
+
+
+def count_segments(text: str) -> int:
+    """Number of billable SMS segments for this text, honouring GSM-7 vs UCS-2."""
+    if is_gsm7(text):
+        costs = [2 if ch in GSM7_EXTENDED else 1 for ch in text]
+        single, multi = 160, 153
+    else:
+        costs = [2 if ord(ch) > 0xFFFF else 1 for ch in text]  # UTF-16 code units
+        single, multi = 70, 67
+
+    if sum(costs) <= single:
+        return 1
+
+    # Escape pairs and surrogate pairs can't straddle a segment boundary.
+    segments, used = 1, 0
+    for cost in costs:
+        if used + cost > multi:
+            segments += 1
+            used = 0
+        used += cost
+    return segments
+
+
+def transliterate_gsm7(text: str) -> str:
+    """Replace typographic characters that force UCS-2 with GSM-7 equivalents."""
+    return "".join(GSM7_TRANSLITERATIONS.get(ch, ch) for ch in text)
+
+
+def _shorten(body: str) -> str:
+    """Drop the last word of a section body, marking the cut with '...'."""
+    words = body.rstrip(". ").split()
+    if len(words) <= 1:
+        return body
+    return " ".join(words[:-1]).rstrip(",;:-") + "..."
+
+
+def compact_sms(text: str, budget: int = SMS_SEGMENT_BUDGET) -> str:
+    """Fit a coaching SMS into `budget` segments, keeping the ISSUE / FIX NEEDED / REPLY TIP labels."""
+    text = transliterate_gsm7(text)
+    text = re.sub(r"[ ]{2,}", " ", text)
+    text = re.sub(r"\n\s*\n", "\n", text).strip()
+    if count_segments(text) <= budget:
+        return text
+
+    for long_form, short_form in SMS_SHORTHAND.items():
+        text = text.replace(long_form, short_form)
+    if count_segments(text) <= budget:
+        return text
+
+    parts = _SECTION_RE.split(text)
+    if len(parts) < 3:
+        # Not in the Audit.md format (e.g. a digest). Only the issue summary
+        # after each "n) SHIFT Client - SCORE:" prefix is trimmed, so the
+        # greeting, Shift IDs, verdicts, URGENT and reply lines survive intact.
+        lines = text.split("\n")
+        items = {i: m for i, m in ((i, _DIGEST_ITEM_RE.match(line)) for i, line in enumerate(lines)) if m}
+        summaries = {i: m.group(2) for i, m in items.items()}
+        while count_segments("\n".join(lines)) > budget:
+            candidates = [i for i in summaries if len(summaries[i].split()) > SMS_MIN_SUMMARY_WORDS]
+            if not candidates:
+                break  # Over budget rather than lose a verdict or instruction
+            i = max(candidates, key=lambda i: len(summaries[i]))
+            summaries[i] = _shorten(summaries[i])
+            lines[i] = items[i].group(1) + summaries[i]
+        return "\n".join(lines)
+
+    head, sections = parts[0], dict(zip(parts[1::2], parts[2::2]))
+    closing = ""
+    last = parts[-2]
+    match = _CLOSING_RE.search(sections[last])
+    if match:
+        closing = sections[last][match.start():]
+        sections[last] = sections[last][:match.start()]
+
+    def assemble():
+        body = "\n".join(f"{label} {sections[label].strip()}"
+                         for label in SECTION_LABELS if label in sections)
+        return "\n".join(p for p in (head.strip(), body, closing.strip()) if p)
+
+    # Trim the longest section a word at a time, so no single section is
+    # gutted while the others stay verbose. Each section keeps at least
+    # SMS_MIN_SECTION_WORDS; past that we go over budget rather than send a
+    # message too short to act on.
+    while count_segments(assemble()) > budget:
+        candidates = [label for label in SECTION_LABELS if label in sections
+                      and len(sections[label].split()) > SMS_MIN_SECTION_WORDS]
+        if not candidates:
+            break
+        label = max(candidates, key=lambda l: len(sections[l]))
+        shorter = _shorten(sections[label].strip())
+        if shorter == sections[label].strip():
+            break
+        sections[label] = shorter
+
+    return assemble()
+
+
+def optimize_sms(body: str, budget: int = None) -> tuple:
+    """Return (body_to_send, segments_before, segments_after)."""
+    before = count_segments(body)
+    if not SMS_OPTIMIZE:
+        return body, before, before
+    optimized = compact_sms(body, budget or SMS_SEGMENT_BUDGET)
+    return optimized, before, count_segments(optimized)
 
 
 # ── Simulator Outbox ─────────────────────────────────────────────────────────
@@ -78,7 +279,8 @@ def load_outbox() -> list:
         return json.load(f)
 
 
-def save_to_outbox(to_number: str, body: str, staff_name: str = "Unknown") -> str:
+def save_to_outbox(to_number: str, body: str, staff_name: str = "Unknown",
+                   trace_ids: list = None) -> str:
     """Write an SMS to the local outbox file. Returns a fake SID."""
     outbox = load_outbox()
     fake_sid = f"SIM{int(time.time() * 1000)}{len(outbox):04d}"
@@ -90,6 +292,7 @@ def save_to_outbox(to_number: str, body: str, staff_name: str = "Unknown") -> st
         "staff_name": staff_name,
         "direction": "outbound",
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "trace_ids": [t for t in (trace_ids or []) if t],
     })
     with open(OUTBOX_FILE, "w", encoding="utf-8") as f:
         json.dump(outbox, f, indent=2, ensure_ascii=False)
@@ -98,10 +301,11 @@ def save_to_outbox(to_number: str, body: str, staff_name: str = "Unknown") -> st
 
 # ── SMS Sending ──────────────────────────────────────────────────────────────
 
-def send_sms(to_number: str, body: str, staff_name: str = "Unknown") -> str:
+def send_sms(to_number: str, body: str, staff_name: str = "Unknown",
+             trace_ids: list = None) -> str:
     """Send an SMS via Twilio, or write to outbox in simulator mode."""
     if SIMULATOR_MODE:
-        sid = save_to_outbox(to_number, body, staff_name)
+        sid = save_to_outbox(to_number, body, staff_name, trace_ids)
         print(f"  [SIM] Written to sms_outbox.json (SID={sid})")
         return sid
 
@@ -114,10 +318,12 @@ def send_sms(to_number: str, body: str, staff_name: str = "Unknown") -> str:
     return message.sid
 
 
-def log_sms(staff: str, number: str, body: str, sid: str, log_path: Path):
+def log_sms(staff: str, number: str, body: str, sid: str, log_path: Path,
+            trace_ids: list = None):
     """Append a timestamped entry to sms_history.log."""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    entry = f"[{timestamp}] SID={sid} | To={staff} ({number}) | Body={body}\n"
+    trace = ",".join(t for t in (trace_ids or []) if t) or "-"
+    entry = f"[{timestamp}] SID={sid} | Trace={trace} | To={staff} ({number}) | Body={body}\n"
     with open(log_path, "a", encoding="utf-8") as f:
         f.write(entry)
 
@@ -126,35 +332,162 @@ def log_sms(staff: str, number: str, body: str, sid: str, log_path: Path):
 
 def load_pending() -> dict:
     """Load existing pending fixes. Returns empty dict if file doesn't exist."""
-    if not PENDING_FILE.exists():
-        return {}
-    with open(PENDING_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return jsonstore.read_json(PENDING_FILE, {})
 
 
 def save_pending(pending: dict):
-    """Write pending fixes to JSON immediately."""
-    with open(PENDING_FILE, "w", encoding="utf-8") as f:
-        json.dump(pending, f, indent=2, ensure_ascii=False)
+    """Write pending fixes to JSON immediately (atomically)."""
+    jsonstore.write_json(PENDING_FILE, pending)
+
+
+def _refresh(pending: dict, fresh: dict):
+    """Point the caller's dict at the state just saved, replies received mid-run included."""
+    pending.clear()
+    pending.update(fresh)
 
 
 def record_pending_fix(pending: dict, phone: str, staff: str, client: str,
-                       shift_id: str, score: str, risk: str, sms_body: str):
-    """Add or update a pending fix entry and save to disk immediately."""
-    pending[phone] = {
-        "staff_name": staff,
-        "client": client,
-        "shift_id": shift_id,
-        "audit_score": score,
-        "risk_level": risk,
-        "coaching_sms": sms_body,
-        "status": "AWAITING_REPLY",
-        "timestamp": int(time.time()),
-    }
-    save_pending(pending)
+                       shift_id: str, score: str, risk: str, sms_body: str,
+                       trace_id: str = ""):
+    """Add or update a pending fix entry and save to disk immediately.
+
+    The top-level fields describe the latest flagged shift; `shifts` keeps every
+    flagged shift for this worker so a digest's replies can be tracked per shift.
+    The file is re-read under the lock, so fixes the webhook saved mid-run are kept.
+    """
+    now = int(time.time())
+    with jsonstore.locked(PENDING_FILE):
+        fresh = load_pending()
+        shifts = fresh.get(phone, {}).get("shifts", {})
+        shifts[shift_id] = {
+            "client": client,
+            "audit_score": score,
+            "risk_level": risk,
+            "status": "AWAITING_REPLY",
+            "timestamp": now,
+            "trace_id": trace_id,
+        }
+        fresh[phone] = {
+            "staff_name": staff,
+            "client": client,
+            "shift_id": shift_id,
+            "audit_score": score,
+            "risk_level": risk,
+            "coaching_sms": sms_body,
+            "status": "AWAITING_REPLY",
+            "timestamp": now,
+            "trace_id": trace_id,
+            "shifts": shifts,
+        }
+        save_pending(fresh)
+    _refresh(pending, fresh)
     print(f"[SAVED STATE] Pending fix recorded for {staff} ({phone})")
 
 
+def mark_sent(pending: dict, phone: str, shift_ids: list, sent_at: float) -> list:
+    """Stamp when each shift's coaching SMS actually went out.
+
+    `sent_at` opens the reply span and is the base for every reminder /
+    escalation deadline, so shifts that were never texted are never chased.
+    Returns the escalation entries to queue; callers pass them to
+    escalation.schedule_pending once per run or flush, not once per SMS.
+    """
+    sent_at = round(sent_at, 3)
+    entries = []
+    with jsonstore.locked(PENDING_FILE):
+        fresh = load_pending()
+        shifts = fresh.get(phone, {}).get("shifts", {})
+        for shift_id in shift_ids:
+            if shift_id in shifts:
+                shift = shifts[shift_id]
+                shift["sent_at"] = sent_at
+                entries.append((phone, shift_id, shift["audit_score"], shift["risk_level"], sent_at))
+        save_pending(fresh)
+    _refresh(pending, fresh)
+    return entries
+
+
+def trace_sent(items: list, sent_at: float, sid: str):
+    """Close the notify span for every flagged row delivered by one SMS."""
+    for item in items:
+        picked_up = item.get("picked_up", item.get("queued_at", sent_at))
+        tracing.record_span(item.get("trace_id", ""), "notify", picked_up, sent_at,
+                            shift_id=item["shift_id"], sid=sid)
+
+
+# ── Delivery ─────────────────────────────────────────────────────────────────
+
+def route_number(e164_number: str) -> str:
+    """Where an SMS for this worker actually goes, given the current safety flags."""
+    if SIMULATOR_MODE:
+        return e164_number
+    return to_e164(TEST_NUMBER) if SAFETY_MODE else e164_number
+
+
+def mode_label() -> str:
+    return "Simulator" if SIMULATOR_MODE else ("Test Mode" if SAFETY_MODE else "LIVE")
+
+
+def flush_digests(force: bool = False, now: float = None,
+                  log_path: Path = BASE_DIR / "sms_history.log") -> tuple:
+    """Send every digest whose window has elapsed (or all, if forced).
+
+    Due digests are claimed (removed from digest_queue.json) under the queue
+    lock before sending, so notify.py and a cron'd digest.py never send the
+    same digest twice. Digests that fail to send are put back for the next flush.
+
+    Returns (sent, errors, segments_before, segments_after).
+    """
+    window = 0 if force else DIGEST_WINDOW_MINUTES * 60
+    sent = errors = segments_before = segments_after = 0
+    sent_phones = {}
+    failed = {}
+
+    with jsonstore.locked(digest.QUEUE_FILE):
+        queue = digest.load_queue()
+        due = {phone: queue.pop(phone) for phone in digest.due_phones(queue, window, now)}
+        if due:
+            digest.save_queue(queue)
+
+    for phone, entry in due.items():
+        staff = entry["staff_name"]
+        body, before, after = optimize_sms(digest.build_digest(staff, entry["items"]),
+                                           DIGEST_SEGMENT_BUDGET)
+        destination = route_number(phone)
+        trace_ids = [i["trace_id"] for i in entry["items"] if i.get("trace_id")]
+        try:
+            sid = send_sms(destination, body, staff_name=staff, trace_ids=trace_ids)
+        except Exception as e:
+            errors += 1
+            failed[phone] = entry
+            print(f"[ERROR] Failed to send digest to {staff}: {e}")
+            continue
+        sent_at = time.time()
+        trace_sent(entry["items"], sent_at, sid)
+        sent_phones[phone] = ([i["shift_id"] for i in entry["items"]], sent_at)
+
+        sent += 1
+        segments_before += before
+        segments_after += after
+        print(f'[DIGEST SENT] To {staff} ({mode_label()}): '
+              f'{len(entry["items"])} note(s) [{after} segment(s)]')
+        log_sms(staff, destination, body, sid, log_path, trace_ids)
+
+    if failed:
+        with jsonstore.locked(digest.QUEUE_FILE):
+            queue = digest.load_queue()
+            for phone, entry in failed.items():
+                digest.requeue(queue, phone, entry)
+            digest.save_queue(queue)
+    if sent_phones:
+        pending = load_pending()
+        escalation_entries = []
+        for phone, (shift_ids, sent_at) in sent_phones.items():
+            escalation_entries += mark_sent(pending, phone, shift_ids, sent_at)
+        escalation.schedule_pending(escalation_entries)
+    return sent, errors, segments_before, segments_after
+
+
 # ── Main Logic ───────────────────────────────────────────────────────────────
 
 def main():
@@ -162,8 +495,9 @@ def main():
     staff_path = BASE_DIR / "staff_list.csv"
     log_path = BASE_DIR / "sms_history.log"
 
+    run_started = time.time()
     report = pd.read_csv(report_path)
-    phonebook = build_phonebook(staff_path)
+    resolver = StaffResolver(load_staff(staff_path))
     pending = load_pending()
 
     existing_count = len(pending)
@@ -174,6 +508,13 @@ def main():
     skipped_count = 0
     error_count = 0
     state_count = 0
+    fuzzy_count = 0
+    escalation_entries = []
+    name_reviews = []
+    queued_count = 0
+    digest_count = 0
+    segments_before = 0
+    segments_after = 0
 
     if SIMULATOR_MODE:
         print(f"[SIM] SIMULATOR MODE ON — SMS written to sms_outbox.json (no Twilio)")
@@ -183,6 +524,9 @@ def main():
 
     if TEST_CHEAP_MODE:
         print(f"💰 CHEAP MODE ON — sending 1 summary SMS only\n")
+    elif DIGEST_MODE:
+        print(f"📨 DIGEST MODE ON — batching per worker over {DIGEST_WINDOW_MINUTES} min"
+              f"{' (CRITICAL sent immediately)' if DIGEST_CRITICAL_BYPASS else ''}\n")
     else:
         print()
 
@@ -196,7 +540,11 @@ def main():
         risk = str(row.get("risk_level", "")).strip().upper()
         sms_body = str(row.get("coaching_sms", "")).strip()
         client = str(row.get("Client", "")).strip()
-        shift_id = str(row.get("Shift ID", f"Row-{idx}")).strip()
+        shift_id = rollup.row_key(row, idx)  # Same key the rollup uses, so fix replies find it
+        trace_id = str(row.get("trace_id", "")).strip()
+        if trace_id.lower() == "nan":
+            trace_id = ""
+        picked_up = time.time()
 
         if score not in ("FAIL", "CRITICAL") and risk != "HIGH":
             skipped_count += 1
@@ -206,22 +554,38 @@ def main():
             skipped_count += 1
             continue
 
-        real_number = phonebook.get(staff)
-        if not real_number:
-            print(f"[SKIP] No phone number found for '{staff}'")
+        match = resolver.resolve(staff)
+        if match["status"] not in ("EXACT", "MATCHED"):
+            print(f"[REVIEW] {score} note {shift_id}: '{staff}' is {match['status']} "
+                  f"(best {match['confidence']:.2f}) — added to {NAME_REVIEW_FILE.name}")
+            name_reviews.append({
+                "staff_member": staff, "shift_id": shift_id, "client": client,
+                "audit_score": score, "risk_level": risk, "status": match["status"],
+                "candidates": [{"name": c["name"], "confidence": c["confidence"]}
+                               for c in match["candidates"]],
+                "trace_id": trace_id,
+                "timestamp": int(time.time()),
+            })
             skipped_count += 1
             continue
 
+        if match["status"] == "MATCHED":
+            print(f"[MATCHED] '{staff}' -> '{match['name']}' (confidence {match['confidence']:.2f})")
+            fuzzy_count += 1
+        staff = match["name"]
+        real_number = match["number"]
+
         e164_number = to_e164(real_number)
 
         # ── Save state for EVERY flagged row (regardless of cheap mode) ──
         record_pending_fix(pending, e164_number, staff, client,
-                           shift_id, score, risk, sms_body)
+                           shift_id, score, risk, sms_body, trace_id)
         state_count += 1
 
         flagged.append({"staff": staff, "score": score, "risk": risk,
                         "sms_body": sms_body, "real_number": real_number,
-                        "e164": e164_number})
+                        "e164": e164_number, "client": client, "shift_id": shift_id,
+                        "trace_id": trace_id, "picked_up": picked_up})
 
     # ── Send SMS ─────────────────────────────────────────────────────────────
 
@@ -239,15 +603,20 @@ def main():
         summary_lines.append(f"Worst: {worst['staff']} ({worst['score']}/{worst['risk']})")
         summary_lines.append(f"Sample: {worst['sms_body'][:100]}")
 
-        body = "\n".join(summary_lines)
+        body, before, after = optimize_sms("\n".join(summary_lines))
         destination = worst["e164"] if SIMULATOR_MODE else to_e164(TEST_NUMBER)
 
         try:
-            sid = send_sms(destination, body, staff_name="SUMMARY")
+            sid = send_sms(destination, body, staff_name="SUMMARY", trace_ids=[worst["trace_id"]])
             sent_count = 1
+            sent_at = time.time()
+            trace_sent([worst], sent_at, sid)
+            escalation_entries += mark_sent(pending, worst["e164"], [worst["shift_id"]], sent_at)
+            segments_before += before
+            segments_after += after
             print(f"\n[SMS SENT] Summary ({destination}):")
             print(f"  {body}\n")
-            log_sms("CHEAP_MODE_SUMMARY", destination, body, sid, log_path)
+            log_sms("CHEAP_MODE_SUMMARY", destination, body, sid, log_path, [worst["trace_id"]])
         except Exception as e:
             error_count = 1
             print(f"[ERROR] Failed to send summary: {e}")
@@ -255,27 +624,79 @@ def main():
         skipped_count += len(flagged) - 1
 
     elif not TEST_CHEAP_MODE:
-        for f in flagged:
-            destination = f["e164"] if SIMULATOR_MODE else (
-                to_e164(TEST_NUMBER) if SAFETY_MODE else f["e164"])
-            mode_label = "Simulator" if SIMULATOR_MODE else (
-                "Test Mode" if SAFETY_MODE else "LIVE")
+        individual = flagged
+
+        if DIGEST_MODE:
+            individual = []
+            # Locked load -> enqueue -> save: a cron'd digest.py may be flushing right now.
+            with jsonstore.locked(digest.QUEUE_FILE):
+                queue = digest.load_queue()
+                for f in flagged:
+                    if DIGEST_CRITICAL_BYPASS and f["score"] == "CRITICAL":
+                        individual.append(f)
+                        continue
+                    digest.enqueue(queue, f["e164"], f["staff"], {
+                        "shift_id": f["shift_id"], "client": f["client"], "score": f["score"],
+                        "risk": f["risk"], "sms_body": f["sms_body"],
+                        "trace_id": f["trace_id"], "picked_up": f["picked_up"]})
+                    queued_count += 1
+                digest.save_queue(queue)
+
+        for f in individual:
+            destination = route_number(f["e164"])
+
+            body, before, after = optimize_sms(f["sms_body"])
 
             try:
-                sid = send_sms(destination, f["sms_body"], staff_name=f["staff"])
+                sid = send_sms(destination, body, staff_name=f["staff"], trace_ids=[f["trace_id"]])
                 sent_count += 1
-                print(f'[SMS SENT] To {f["staff"]} ({mode_label}): "{f["sms_body"][:70]}..."')
-                log_sms(f["staff"], destination, f["sms_body"], sid, log_path)
+                sent_at = time.time()
+                trace_sent([f], sent_at, sid)
+                escalation_entries += mark_sent(pending, f["e164"], [f["shift_id"]], sent_at)
+                segments_before += before
+                segments_after += after
+                print(f'[SMS SENT] To {f["staff"]} ({mode_label()}): "{body[:70]}..." '
+                      f'[{after} segment(s)]')
+                log_sms(f["staff"], destination, body, sid, log_path, [f["trace_id"]])
             except Exception as e:
                 error_count += 1
                 print(f'[ERROR] Failed to send to {f["staff"]}: {e}')
 
+        if DIGEST_MODE:
+            sent, errors, before, after = flush_digests(log_path=log_path)
+            digest_count = sent
+            sent_count += sent
+            error_count += errors
+            segments_before += before
+            segments_after += after
+
+    # One queue update for every SMS sent directly this run (digests queue their own).
+    escalation.schedule_pending(escalation_entries)
+
     # ── Summary ──────────────────────────────────────────────────────────────
 
     print(f"{'='*50}")
     print(f"Sent {sent_count} SMS alert(s).")
+    if sent_count:
+        print(f"Segments billed: {segments_after} "
+              f"(saved {segments_before - segments_after} of {segments_before} by GSM-7 optimisation)")
     print(f"Flagged {len(flagged)} notes total.")
+    if DIGEST_MODE and not TEST_CHEAP_MODE:
+        print(f"Digest: {queued_count} note(s) queued, {digest_count} digest(s) sent, "
+              f"{len(digest.load_queue())} worker(s) waiting in {digest.QUEUE_FILE.name}")
     print(f"State saved: {state_count} pending fix(es) in pending_fixes.json")
+    escalation_count = sum(1 for record in load_pending().values()
+                           for shift in record.get("shifts", {}).values()
+                           if shift.get("sent_at", 0) >= run_started)
+    if escalation_count:
+        print(f"Escalation deadlines queued: {escalation_count} (one per shift texted this run; "
+              f"run: python3 escalation.py)")
+    if fuzzy_count:
+        print(f"Fuzzy-matched {fuzzy_count} staff name(s) to staff_list.csv.")
+    if name_reviews:
+        added = save_name_reviews(name_reviews)
+        print(f"⚠️  {len(name_reviews)} flagged note(s) need a staff name review "
+              f"({NAME_REVIEW_FILE.name}, {added} new) — NOT sent.")
     print(f"Skipped {skipped_count} compliant/empty notes.")
     if error_count:
         print(f"Errors: {error_count} (check logs).")
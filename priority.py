@@ -0,0 +1,95 @@
+"""
+Risk Prioritisation — cheap local pre-scoring so likely-CRITICAL notes are audited first.
+
+Keywords come straight from the red-flag tables in Audit.md (sections 2a and
+2b), so the scheduler and the AEGIS Core always agree on what counts as a
+restrictive practice or reportable incident. Scores only decide dispatch
+order; the LLM still grades every note.
+"""
+
+import re
+from pathlib import Path
+
+# Score weights. A single restrictive-practice hit outranks any number of
+# plain incident hits, matching Audit.md's HIGH vs MEDIUM risk levels.
+RESTRICTIVE_WEIGHT = 100
+INCIDENT_WEIGHT = 10
+UNFLAGGED_INCIDENT_WEIGHT = 20
+EMPTY_GOALS_WEIGHT = 1
+
+_TABLE_ROW_RE = re.compile(r"^\|\s*\*\*(.+?)\*\*\s*\|\s*(.+?)\s*\|\s*$")
+
+# ── Keywords ─────────────────────────────────────────────────────────────────
+
+def _section_keywords(markdown: str, heading: str) -> list:
+    """Keywords from the first markdown table under a '#### <heading>' section."""
+    lines = markdown.splitlines()
+    start = next((i for i, line in enumerate(lines)
+                  if line.startswith("####") and line[4:].strip().startswith(heading)), None)
+    if start is None:
+        return []
+
+    keywords, in_table = [], False
+    for line in lines[start + 1:]:
+        if line.startswith("#"):
+            break
+        if line.strip().startswith("|"):
+            in_table = True
+            row = _TABLE_ROW_RE.match(line.strip())
+            if row:
+                keywords.extend(k.strip().lower() for k in row.group(2).split(",") if k.strip())
+        elif in_table:
+            break
+    return keywords
+
+
+def _compile(keywords: list):
+    if not keywords:
+        return None
+    alternatives = sorted((re.escape(k) for k in keywords), key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)", re.IGNORECASE)
+
+
+def load_keywords(audit_md: Path) -> dict:
+    """Compile the incident (2a) and restrictive-practice (2b) keyword tables from Audit.md."""
+    markdown = Path(audit_md).read_text(encoding="utf-8")
+    return {
+        "incident": _compile(_section_keywords(markdown, "2a.")),
+        "restrictive": _compile(_section_keywords(markdown, "2b.")),
+    }
+
+# ── Scoring ──────────────────────────────────────────────────────────────────
+
+def _is_blank(value) -> bool:
+    text = str(value).strip()
+    return not text or text.lower() == "nan"
+
+
+def score_row(note: str, goals: str, incident_flag: str, keywords: dict) -> int:
+    """Estimate how likely a note is to come back HIGH risk / CRITICAL. Higher goes first."""
+    if _is_blank(note):
+        return 0
+
+    restrictive = keywords["restrictive"].findall(note) if keywords["restrictive"] else []
+    incidents = keywords["incident"].findall(note) if keywords["incident"] else []
+
+    score = RESTRICTIVE_WEIGHT * len(set(restrictive))
+    score += INCIDENT_WEIGHT * len(set(incidents))
+
+    # Red flags in the text but the worker didn't tick the incident box.
+    if (restrictive or incidents) and str(incident_flag).strip().lower() != "yes":
+        score += UNFLAGGED_INCIDENT_WEIGHT
+
+    if _is_blank(goals):
+        score += EMPTY_GOALS_WEIGHT
+    return score
+
+
+def dispatch_order(df, keywords: dict) -> tuple:
+    """Return (row positions sorted highest risk first, per-row scores). Ties keep file order."""
+    scores = [
+        score_row(str(row.get("Progress Note", "")), str(row.get("Goals Referenced", "")),
+                  str(row.get("Incident Flag (Manual)", "")), keywords)
+        for _, row in df.iterrows()
+    ]
+    return sorted(range(len(scores)), key=lambda pos: -scores[pos]), scores
@@ -0,0 +1,254 @@
+"""
+Compliance Rollup — per-day aggregates by staff, participant, shift type and goal.
+
+audit.py records every result in compliance_rollup.db (SQLite) as it is
+produced, and fix replies (webhooks.py / sms_simulator.py) adjust the affected
+day buckets in place, so trend queries never need to reload historical audit
+reports.
+
+Usage:
+    python3 rollup.py --by staff --days 30
+    python3 rollup.py --by participant --days 90 --key "Olivia C. (Participant)"
+    python3 rollup.py --by shift_type
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+ROLLUP_DB = BASE_DIR / "compliance_rollup.db"
+
+DIMENSIONS = ("staff", "participant", "shift_type", "goal")
+COUNTERS = ("notes", "pass", "fail", "critical", "skipped",
+            "restrictive", "incidents", "language_sum", "language_n", "fixed")
+
+# Day buckets and the per-row index live in separate tables, so a query reads
+# only the buckets it sums and a fix reply touches one row plus its buckets.
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS buckets (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    {", ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in COUNTERS)},
+    PRIMARY KEY (dimension, key, day)
+);
+CREATE INDEX IF NOT EXISTS buckets_by_day ON buckets (dimension, day);
+CREATE TABLE IF NOT EXISTS rows (
+    row_key TEXT PRIMARY KEY,
+    day TEXT NOT NULL,
+    staff TEXT,
+    participant TEXT,
+    shift_type TEXT,
+    goals TEXT,
+    result TEXT
+);
+"""
+
+_UPSERT = (f"INSERT INTO buckets (dimension, key, day, {', '.join(COUNTERS)}) "
+           f"VALUES (?, ?, ?, {', '.join('?' for _ in COUNTERS)}) "
+           f"ON CONFLICT (dimension, key, day) DO UPDATE SET "
+           + ", ".join(f"{c} = {c} + excluded.{c}" for c in COUNTERS))
+
+# ── Connection ───────────────────────────────────────────────────────────────
+
+def connect(path: Path = None) -> sqlite3.Connection:
+    """Open the rollup database, creating the tables on first use.
+
+    WAL mode lets queries run while audit.py or the webhook is writing.
+    """
+    conn = sqlite3.connect(str(path or ROLLUP_DB), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+# ── Row Keys ─────────────────────────────────────────────────────────────────
+
+def row_day(row) -> str:
+    """Bucket day for an export / report row: its Date, else today."""
+    day = str(row.get("Date", "")).strip()
+    return day if day and day.lower() != "nan" else date.today().isoformat()
+
+
+def row_key(row, position: int) -> str:
+    """Rollup key for the row at 0-based `position`: its Shift ID, else '<day>:Row-<n>'.
+
+    notify.py uses the same key as the pending fix's shift ID, so a fix reply
+    for a row without a Shift ID still finds its bucket via record_fix.
+    """
+    shift_id = str(row.get("Shift ID", "")).strip()
+    if shift_id and shift_id.lower() != "nan":
+        return shift_id
+    return f"{row_day(row)}:Row-{position + 1}"
+
+# ── Bucket Updates ───────────────────────────────────────────────────────────
+
+def _counters(result: dict) -> dict:
+    """Counter increments contributed by one audited row."""
+    score = str(result.get("audit_score", "")).upper()
+    counts = dict.fromkeys(COUNTERS, 0)
+    counts["notes"] = 1
+    if score in ("PASS", "FAIL", "CRITICAL", "SKIPPED"):
+        counts[score.lower()] = 1
+    counts["restrictive"] = int(str(result.get("restrictive_practice_warning", "")).lower() == "true")
+    counts["incidents"] = int(result.get("incident_count", 0))
+    try:
+        counts["language_sum"] = int(result.get("language_score"))
+        counts["language_n"] = 1
+    except (TypeError, ValueError):
+        pass
+    counts["fixed"] = int(bool(result.get("fixed")))
+    return counts
+
+
+def _apply(conn: sqlite3.Connection, row: dict, sign: int):
+    """Add (sign=1) or retract (sign=-1) a row's contribution in every dimension it touches."""
+    counts = _counters(row["result"])
+    values = [sign * counts[c] for c in COUNTERS]
+    keys = {"staff": [row["staff"]], "participant": [row["participant"]],
+            "shift_type": [row["shift_type"]], "goal": row["goals"]}
+    conn.executemany(_UPSERT, [(dimension, key, row["day"], *values)
+                               for dimension, dim_keys in keys.items()
+                               for key in dim_keys if key])
+
+
+def _load_row(conn: sqlite3.Connection, row_key: str):
+    found = conn.execute("SELECT day, staff, participant, shift_type, goals, result "
+                         "FROM rows WHERE row_key = ?", (row_key,)).fetchone()
+    if found is None:
+        return None
+    day, staff, participant, shift_type, goals, result = found
+    return {"day": day, "staff": staff, "participant": participant, "shift_type": shift_type,
+            "goals": json.loads(goals), "result": json.loads(result)}
+
+
+def _save_row(conn: sqlite3.Connection, row_key: str, row: dict):
+    conn.execute("INSERT OR REPLACE INTO rows (row_key, day, staff, participant, shift_type, goals, result) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                 (row_key, row["day"], row["staff"], row["participant"], row["shift_type"],
+                  json.dumps(row["goals"], ensure_ascii=False),
+                  json.dumps(row["result"], ensure_ascii=False)))
+
+
+def record_result(conn: sqlite3.Connection, row_key: str, day: str, staff: str, participant: str,
+                  shift_type: str, goals: str, result: dict):
+    """Add one audit result to the day buckets. Re-recording a row replaces its old contribution.
+
+    Commits immediately, so fixes recorded by the webhook mid-run are never overwritten.
+    """
+    incidents = result.get("detected_incidents", [])
+    if isinstance(incidents, str):
+        incidents = [i for i in incidents.split(",") if i.strip()]
+
+    row = {
+        "day": day,
+        "staff": staff,
+        "participant": participant,
+        "shift_type": shift_type,
+        "goals": [g.strip() for g in str(goals).split(",") if g.strip() and g.strip().lower() != "nan"],
+        "result": {
+            "audit_score": result.get("audit_score", ""),
+            "language_score": result.get("language_score", ""),
+            "restrictive_practice_warning": result.get("restrictive_practice_warning", ""),
+            "incident_count": len(incidents),
+            "fixed": False,
+        },
+    }
+    with conn:
+        old = _load_row(conn, row_key)
+        if old is not None:
+            _apply(conn, old, -1)
+        _save_row(conn, row_key, row)
+        _apply(conn, row, 1)
+
+
+def correct_row(conn: sqlite3.Connection, row_key: str, **changes) -> bool:
+    """Apply a late correction to an already-recorded row, adjusting its original day buckets."""
+    with conn:
+        row = _load_row(conn, row_key)
+        if row is None:
+            return False
+        _apply(conn, row, -1)
+        row["result"].update(changes)
+        _save_row(conn, row_key, row)
+        _apply(conn, row, 1)
+    return True
+
+
+def record_fix(shift_id: str) -> bool:
+    """Mark a shift as fixed after a worker's reply. Returns False if the shift was never rolled up."""
+    conn = connect()
+    try:
+        return correct_row(conn, shift_id, fixed=True)
+    finally:
+        conn.close()
+
+# ── Queries ──────────────────────────────────────────────────────────────────
+
+def query(conn: sqlite3.Connection, dimension: str, days: int = None, key: str = None,
+          today: date = None) -> dict:
+    """Sum day buckets over the last `days` days as {key: metrics}."""
+    today = today or date.today()
+    start = (today - timedelta(days=days - 1)).isoformat() if days else ""
+    end = today.isoformat()
+
+    sql = (f"SELECT key, {', '.join(f'SUM({c})' for c in COUNTERS)} FROM buckets "
+           f"WHERE dimension = ? AND day BETWEEN ? AND ?")
+    params = [dimension, start, end]
+    if key is not None:
+        sql += " AND key = ?"
+        params.append(key)
+    sql += " GROUP BY key"
+
+    results = {}
+    for bucket_key, *sums in conn.execute(sql, params):
+        totals = dict(zip(COUNTERS, sums))
+        if not totals["notes"]:
+            continue
+
+        audited = totals["pass"] + totals["fail"] + totals["critical"]
+        flagged = totals["fail"] + totals["critical"]
+        totals["fail_rate"] = flagged / audited if audited else 0.0
+        totals["mean_language"] = (totals["language_sum"] / totals["language_n"]
+                                   if totals["language_n"] else None)
+        totals["open_fixes"] = max(flagged - totals["fixed"], 0)
+        results[bucket_key] = totals
+    return results
+
+# ── Main ─────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Query compliance aggregates.")
+    parser.add_argument("--by", choices=DIMENSIONS, default="staff", help="Dimension to group by")
+    parser.add_argument("--days", type=int, help="Window size in days ending today (default: all time)")
+    parser.add_argument("--key", help="Only show this staff member / participant / shift type / goal")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    conn = connect()
+    results = query(conn, args.by, args.days, args.key)
+    conn.close()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    window = f"last {args.days} day(s)" if args.days else "all time"
+    print(f"{'='*78}")
+    print(f"Compliance by {args.by} — {window}")
+    print(f"{'='*78}")
+    print(f"{'Key':30s} {'Notes':>6s} {'FAIL%':>6s} {'CRIT':>5s} {'RP':>4s} "
+          f"{'Inc':>4s} {'Lang':>5s} {'Open':>5s}")
+    for bucket_key, m in sorted(results.items(), key=lambda kv: -kv[1]["fail_rate"]):
+        lang = f"{m['mean_language']:.0f}" if m["mean_language"] is not None else "—"
+        print(f"{bucket_key[:30]:30s} {m['notes']:6d} {m['fail_rate']:6.0%} {m['critical']:5d} "
+              f"{m['restrictive']:4d} {m['incidents']:4d} {lang:>5s} {m['open_fixes']:5d}")
+    if not results:
+        print("  No audited notes in this window.")
+    print(f"{'─'*78}")
+    print(f"{len(results)} row(s) in {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,11 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
+import digest
+import jsonstore
+import rollup
+import tracing
+
 BASE_DIR = Path(__file__).parent
 OUTBOX_FILE = BASE_DIR / "sms_outbox.json"
 PENDING_FILE = BASE_DIR / "pending_fixes.json"
@@ -42,20 +47,17 @@ def save_outbox(outbox: list):
 
 
 def load_pending() -> dict:
-    if not PENDING_FILE.exists():
-        return {}
-    with open(PENDING_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return jsonstore.read_json(PENDING_FILE, {})
 
 
 def save_pending(pending: dict):
-    with open(PENDING_FILE, "w", encoding="utf-8") as f:
-        json.dump(pending, f, indent=2, ensure_ascii=False)
+    jsonstore.write_json(PENDING_FILE, pending)
 
 
-def log_fix(staff: str, number: str, shift_id: str, body: str):
+def log_fix(staff: str, number: str, shift_id: str, body: str, trace_id: str = ""):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    entry = f"[{timestamp}] From={staff} ({number}) | Shift={shift_id} | Fix={body}\n"
+    entry = (f"[{timestamp}] Trace={trace_id or '-'} | From={staff} ({number}) | "
+             f"Shift={shift_id} | Fix={body}\n")
     with open(FIX_LOG, "a", encoding="utf-8") as f:
         f.write(entry)
 
@@ -193,15 +195,20 @@ def handle_reply(conversations: dict):
         print(f"  {DIM}Cancelled.{RESET}\n")
         return
 
-    pending = load_pending()
-    record = pending.get(phone)
+    # 1. Update pending_fixes.json (locked: the webhook or notify.py may be writing too)
+    with jsonstore.locked(PENDING_FILE):
+        pending = load_pending()
+        record = pending.get(phone)
+        if record:
+            shift_id = digest.resolve_reply_shift(record, reply)
+            trace_id = tracing.record_reply(record, shift_id)
+            digest.apply_fix(record, shift_id, reply)
+            save_pending(pending)
     if not record:
         print(f"  {RED}No pending audit found for {phone}.{RESET}\n")
         return
 
-    shift_id = record.get("shift_id", "N/A")
-
-    # 1. Append inbound reply to outbox
+    # 2. Append inbound reply to outbox
     outbox = load_outbox()
     outbox.append({
         "sid": f"REPLY-{int(datetime.now().timestamp() * 1000)}",
@@ -211,19 +218,17 @@ def handle_reply(conversations: dict):
         "staff_name": staff_name,
         "direction": "inbound",
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "trace_ids": [trace_id] if trace_id else [],
     })
     save_outbox(outbox)
 
-    # 2. Update pending_fixes.json
-    record["status"] = "FIX_RECEIVED"
-    record["fix_received"] = reply
-    record["fix_timestamp"] = int(datetime.now().timestamp())
-    save_pending(pending)
+    # 3. Mark the shift fixed in the compliance rollup
+    rollup.record_fix(shift_id)
 
-    # 3. Log to fix_history.log
-    log_fix(staff_name, phone, shift_id, reply)
+    # 4. Log to fix_history.log
+    log_fix(staff_name, phone, shift_id, reply, trace_id)
 
-    print(f"\n  {GREEN}Fix received from {staff_name} — state updated.{RESET}\n")
+    print(f"\n  {GREEN}Fix received from {staff_name} for {shift_id} — state updated.{RESET}\n")
 
 
 # ── Clear Outbox ──────────────────────────────────────────────────────────────
@@ -0,0 +1,140 @@
+"""
+Pipeline Tracing — one trace ID per export row, with timestamped stage spans.
+
+audit.py assigns the trace ID and it travels with the row through notify.py,
+the outbox / Twilio send, digests, pending_fixes.json and the reply handlers.
+Each stage appends a span to trace_spans.jsonl:
+
+    export  — export file written -> row picked up by audit.py
+    audit   — LLM grading call
+    notify  — notify.py picks up the flagged row -> SMS sent (includes digest wait)
+    reply   — SMS sent -> worker's fix received
+
+The report also shows `handoff` (audit finished -> notify.py picked the row
+up) and `end_to_end` (export -> fix received), derived from the spans.
+
+Usage:
+    python3 tracing.py              # percentile latency per stage
+    python3 tracing.py --days 7     # only traces started in the last 7 days
+"""
+
+import argparse
+import json
+import math
+import time
+import uuid
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+SPANS_FILE = BASE_DIR / "trace_spans.jsonl"
+
+# Recorded stages in pipeline order, with the derived rows slotted in.
+REPORT_ROWS = ("export", "audit", "handoff", "notify", "reply", "end_to_end")
+
+# ── Recording ────────────────────────────────────────────────────────────────
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def record_span(trace_id: str, stage: str, start: float, end: float, **attrs):
+    """Append one stage span (epoch seconds) to trace_spans.jsonl."""
+    if not trace_id or trace_id.lower() == "nan":
+        return
+    span = {"trace_id": trace_id, "stage": stage, "start": round(start, 3),
+            "end": round(end, 3), "duration": round(end - start, 3), **attrs}
+    with open(SPANS_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(span, ensure_ascii=False) + "\n")
+
+
+def record_reply(record: dict, shift_id: str, received_at: float = None) -> str:
+    """Close a trace when a worker's fix arrives. Returns the trace ID ('' if untraced).
+
+    The reply span is only recorded when the shift's SMS was actually sent
+    (`sent_at`); shifts summarised away in cheap mode or still in a digest
+    have no send to measure from.
+    """
+    shift = record.get("shifts", {}).get(shift_id, {})
+    trace_id = shift.get("trace_id", record.get("trace_id", ""))
+    sent_at = shift.get("sent_at")
+    if trace_id and sent_at:
+        record_span(trace_id, "reply", sent_at, time.time() if received_at is None else received_at,
+                    shift_id=shift_id)
+    return trace_id
+
+
+def load_spans() -> list:
+    """Read every recorded span. Returns empty list if file doesn't exist."""
+    if not SPANS_FILE.exists():
+        return []
+    spans = []
+    with open(SPANS_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                spans.append(json.loads(line))
+    return spans
+
+# ── Reporting ────────────────────────────────────────────────────────────────
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already-sorted list."""
+    rank = max(math.ceil(pct / 100 * len(values)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def stage_latencies(spans: list, since: float = 0) -> dict:
+    """Group span durations by stage, plus end-to-end export -> reply per trace."""
+    traces = {}
+    for span in spans:
+        traces.setdefault(span["trace_id"], {}).setdefault(span["stage"], span)
+
+    durations = {stage: [] for stage in REPORT_ROWS}
+    for stages in traces.values():
+        first = min(s["start"] for s in stages.values())
+        if first < since:
+            continue
+        for stage, span in stages.items():
+            if stage in durations:
+                durations[stage].append(span["duration"])
+        if "audit" in stages and "notify" in stages:
+            durations["handoff"].append(max(stages["notify"]["start"] - stages["audit"]["end"], 0))
+        if "export" in stages and "reply" in stages:
+            durations["end_to_end"].append(stages["reply"]["end"] - stages["export"]["start"])
+    return durations
+
+
+def _fmt(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    if seconds < 120:
+        return f"{seconds:.1f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency report from trace spans.")
+    parser.add_argument("--days", type=float, help="Only include traces started in the last N days")
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days else 0
+    durations = stage_latencies(load_spans(), since)
+
+    print(f"{'='*62}")
+    print(f"  Pipeline latency by stage ({SPANS_FILE.name})")
+    print(f"{'='*62}")
+    print(f"  {'Stage':12s} {'Count':>6s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'max':>9s}")
+    for stage, values in durations.items():
+        if not values:
+            print(f"  {stage:12s} {0:6d} {'—':>9s} {'—':>9s} {'—':>9s} {'—':>9s}")
+            continue
+        values.sort()
+        print(f"  {stage:12s} {len(values):6d} {_fmt(percentile(values, 50)):>9s} "
+              f"{_fmt(percentile(values, 95)):>9s} {_fmt(percentile(values, 99)):>9s} "
+              f"{_fmt(values[-1]):>9s}")
+    print(f"{'='*62}")
+
+
+if __name__ == "__main__":
+    main()
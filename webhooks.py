@@ -1,10 +1,14 @@
-import json
 from datetime import datetime
 from pathlib import Path
 
 from flask import Flask, request
 from twilio.twiml.messaging_response import MessagingResponse
 
+import digest
+import jsonstore
+import rollup
+import tracing
+
 # ── Configuration ────────────────────────────────────────────────────────────
 
 app = Flask(__name__)
@@ -14,17 +18,20 @@ PENDING_FILE = BASE_DIR / "pending_fixes.json"
 
 def load_pending() -> dict:
     """Load the pending fixes lookup from JSON."""
-    if not PENDING_FILE.exists():
-        return {}
-    with open(PENDING_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return jsonstore.read_json(PENDING_FILE, {})
+
 
+def save_pending(pending: dict):
+    """Write pending fixes back to JSON atomically. Hold jsonstore.locked(PENDING_FILE) around load -> save."""
+    jsonstore.write_json(PENDING_FILE, pending)
 
-def log_fix(staff: str, number: str, shift_id: str, body: str):
+
+def log_fix(staff: str, number: str, shift_id: str, body: str, trace_id: str = ""):
     """Append received fix to a log file."""
     log_path = BASE_DIR / "fix_history.log"
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    entry = f"[{timestamp}] From={staff} ({number}) | Shift={shift_id} | Fix={body}\n"
+    entry = (f"[{timestamp}] Trace={trace_id or '-'} | From={staff} ({number}) | "
+             f"Shift={shift_id} | Fix={body}\n")
     with open(log_path, "a", encoding="utf-8") as f:
         f.write(entry)
 
@@ -41,22 +48,29 @@ def sms_reply():
     print(f"[INCOMING SMS] From: {sender}")
     print(f"[BODY] {body}")
 
-    pending = load_pending()
-    record = pending.get(sender)
+    # Lock across load -> apply -> save so concurrent replies don't drop each other's fixes.
+    with jsonstore.locked(PENDING_FILE):
+        pending = load_pending()
+        record = pending.get(sender)
+        if record:
+            shift_id = digest.resolve_reply_shift(record, body)
+            trace_id = tracing.record_reply(record, shift_id)
+            digest.apply_fix(record, shift_id, body)
+            save_pending(pending)
 
     resp = MessagingResponse()
 
     if record:
         staff_name = record.get("staff_name", "Unknown")
-        shift_id = record.get("shift_id", "N/A")
-        client = record.get("client", "N/A")
+        client = record.get("shifts", {}).get(shift_id, {}).get("client", record.get("client", "N/A"))
         goal = record.get("goal", "N/A")
 
         print(f'[FIX RECEIVED] From {staff_name}: "{body}"')
         print(f"  Shift: {shift_id} | Client: {client} | Goal: {goal}")
         print(f"{'─'*50}\n")
 
-        log_fix(staff_name, sender, shift_id, body)
+        rollup.record_fix(shift_id)
+        log_fix(staff_name, sender, shift_id, body, trace_id)
 
         resp.message(
             f"Thanks {staff_name.split()[0]}! Your updated note for {client} "